@@ -46,13 +46,20 @@ spi = SPI(0, baudrate=30_000_000, mosi=Pin(19), miso=Pin(16), sck=Pin(18))
 gc.collect()  # Precaution before instantiating framebuf
 ssd = SSD(spi, pcs, pdc, prst, usd=False)
 
-from gui.core.ugui import Display
-# Create and export a Display instance
-# Define control buttons
-nxt = Pin(11, Pin.IN)  # Move to next control
-prev = Pin(12, Pin.IN)  # Move to previous control
-sel = Pin(13, Pin.IN)  # Operate current control
-increase = Pin(15, Pin.IN)  # Increase control's value
-decrease = Pin(14, Pin.IN)  # Decrease control's value
-display = Display(ssd, nxt, sel, prev, increase, decrease, encoder=4) # with encoder
-#display = Display(ssd, nxt, sel, prev, increase, decrease) # with buttons
+# Create and export a Display instance. ugui is imported by ui calling gui_setup(),
+# so that wave_boot can start the last wave before the gui loads
+display = None
+
+def gui_setup():
+    global display
+    if display is None:
+        from gui.core.ugui import Display
+        # Define control buttons
+        nxt = Pin(11, Pin.IN)  # Move to next control
+        prev = Pin(12, Pin.IN)  # Move to previous control
+        sel = Pin(13, Pin.IN)  # Operate current control
+        increase = Pin(15, Pin.IN)  # Increase control's value
+        decrease = Pin(14, Pin.IN)  # Decrease control's value
+        display = Display(ssd, nxt, sel, prev, increase, decrease, encoder=4) # with encoder
+        #display = Display(ssd, nxt, sel, prev, increase, decrease) # with buttons
+    return display
@@ -0,0 +1,76 @@
+# Host side benchmark: compiled expressions (wave_expr) against hand-written waveforms
+#
+# run on a PC from the repository root:
+#   python host/bench_expr.py
+# pulse and gaussian written as expressions are filled with their compiled kernel,
+# the hand-written whole-buffer kernel (wave_kernels) and the per-sample path of a
+# hand-written user function (wave_gen.fill_eval). The compiled kernel must not be
+# slower than the per-sample path and must agree with it within one LSB.
+# The expressions of wave_config are compiled and set up once each.
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import emu
+emu.install()
+
+import wave_gen as wg
+import wave_kernels as wk
+from wave_config import expressions
+from wave_expr import compile_expr
+
+CASES = (
+    ('pulse', 'x/p0 if x<p0 else (1 if x<p0+p1 else (1-(x-p0-p1)/p2 if x<p0+p1+p2 else 0))',
+     wg.pulse, wk.fill_pulse, [0.05, 0.5, 0.05], 0.89, 0),
+    ('gauss', 'exp(-((x-0.5)/p0)**2)', wg.gaussian, wk.fill_gaussian, [0.2, 0.5, 0.05], 0.55, 0),
+)
+
+
+def timeit(fill, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fill()
+        dt = time.perf_counter()-t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def main(repeat=10):
+    print('{:6s} {:>6s} {:>10s} {:>10s} {:>10s} {:>7s} {:>6s}'.format(
+        'func', 'nsamp', 'eval us', 'hand us', 'expr us', 'speedup', 'maxLSB'))
+    failed = False
+    for name, text, func, hand, pars, amplitude, offset in CASES:
+        expr = compile_expr(text)
+        kernel = wg.kernels[expr]
+        for nsamp in (512, 2048):
+            ref = bytearray(nsamp)
+            buf = bytearray(nsamp)
+            t_eval = timeit(lambda: wg.fill_eval(func, ref, 0, nsamp, nsamp, 1, 1, pars, amplitude, offset, 8), repeat)
+            t_hand = timeit(lambda: hand(buf, 0, nsamp, nsamp, 1, 1, pars, amplitude, offset, 8), repeat)
+            t_expr = timeit(lambda: kernel(buf, 0, nsamp, nsamp, 1, 1, pars, amplitude, offset, 8), repeat)
+            err = max(abs(a-b) for a, b in zip(ref, buf))
+            print('{:6s} {:6d} {:10.1f} {:10.1f} {:10.1f} {:7.2f} {:6d}'.format(
+                name, nsamp, t_eval*1e6, t_hand*1e6, t_expr*1e6, t_eval/t_expr, err))
+            failed = failed or err > 1 or t_expr > t_eval
+    if compile_expr(text) is not expr:
+        print('ERROR: compiling the same text again gave another function')
+        failed = True
+    buf = bytearray(wg.maxsamp)
+    for name in sorted(expressions):
+        text, amplitude, offset = expressions[name]
+        w = {'func': compile_expr(text), 'pars': [0.5, 0.5, 0.5], 'amplitude': amplitude,
+             'offset': offset, 'replicate': 1, 'frequency': 1000}
+        wg.setupwave(buf, w)
+        print('{:6s} {:5d} samples, F_out {:.1f} Hz: {}'.format(name, w['nsamp'], w['F_out'], text))
+    wg.stopDMA()
+    if failed:
+        print('ERROR: compiled expressions slower than eval or deviating by more than one LSB')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
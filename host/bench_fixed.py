@@ -0,0 +1,91 @@
+# Host side accuracy report and timing of the fixed point kernels
+#
+# run on a PC from the repository root:
+#   python host/bench_fixed.py
+# compares wave_fixed against the float kernels (wave_kernels) and the
+# per-sample reference (host/ref_wave.py). Noise can't match sample by sample,
+# so for noise the mean and standard deviation of the DAC codes of a long
+# buffer are compared.
+# CPython runs float math in hardware, so the timing here only shows the
+# interpreter overhead; on the RP2040 every float op of the float path is soft-float.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wave_kernels as wk
+import wave_fixed as wf
+import ref_wave as ref
+
+kernels = {ref.sine: (wk.fill_sine, wf.fill_sine),
+           ref.pulse: (wk.fill_pulse, wf.fill_pulse),
+           ref.gaussian: (wk.fill_gaussian, wf.fill_gaussian),
+           ref.sinc: (wk.fill_sinc, wf.fill_sinc),
+           ref.exponential: (wk.fill_exponential, wf.fill_exponential),
+           ref.noise: (wk.fill_noise, wf.fill_noise)}
+
+# extra parameter corners on top of the ui defaults
+corners = (
+    ('gauss', ref.gaussian, [0.05], 0.55, 0, 1),
+    ('gauss', ref.gaussian, [0.35], 0.55, 0, 1),
+    ('sinc', ref.sinc, [0.005], 0.5, 0.5, 1),
+    ('sinc', ref.sinc, [0.085], 0.5, 0.5, 1),
+    ('expo', ref.exponential, [0.005], 0.5, 0, -1),
+    ('expo', ref.exponential, [0.155], 0.5, 0, 1),
+    ('pulse', ref.pulse, [0.0, 0.3, 0.0], 0.89, 0, 1),
+    ('noise', ref.noise, [1], 0.3, 0.5, 1),
+    ('noise', ref.noise, [8], 0.2, 0.5, 1),
+)
+
+
+def stats(buf):
+    n = len(buf)
+    m = sum(buf)/n
+    return m, (sum((v-m)**2 for v in buf)/n)**0.5
+
+
+def main(repeat=10):
+    cases = [(n, w) for n, w in ref.waves()]
+    for name, f, pars, amp, off, rep in corners:
+        cases.append((name, {'func': f, 'pars': pars, 'amplitude': amp, 'offset': off, 'replicate': rep}))
+    print('{:6s} {:>8s} {:>6s} {:>4s} {:>9s} {:>9s} {:>9s} {:>7s} {:>7s} {:>8s}'.format(
+        'func', 'par0', 'nsamp', 'dup', 'float us', 'fixed us', 'speedup', 'maxLSB', 'meanLSB', 'vs eval'))
+    worst = 0
+    for name, w in cases:
+        kfloat, kfixed = kernels[w['func']]
+        for nsamp, dup in ((512, 1), (508, 3), (4096, 1)):
+            args = (0, nsamp, nsamp, dup, w['replicate'], w['pars'], w['amplitude'], w['offset'], ref.DACbits)
+            out = bytearray(nsamp)
+            bf = bytearray(nsamp)
+            bx = bytearray(nsamp)
+            t_float = ref.timeit(lambda: kfloat(bf, *args), repeat)
+            t_fixed = ref.timeit(lambda: kfixed(bx, *args), repeat)
+            ref.fill(out, w, nsamp, dup)
+            if name == 'noise':
+                big = (0, 1 << 16, 1 << 16) + args[3:]
+                bf = bytearray(1 << 16)
+                bx = bytearray(1 << 16)
+                kfloat(bf, *big)
+                kfixed(bx, *big)
+                (m0, s0), (m1, s1) = stats(bf), stats(bx)
+                err = max(abs(m0-m1), abs(s0-s1))
+                line = 'mean {:6.1f}/{:6.1f} std {:5.1f}/{:5.1f}'.format(m0, m1, s0, s1)
+                err = 1 if err < 3 else int(err)
+            else:
+                diff = [abs(a-b) for a, b in zip(bf, bx)]
+                err = max(diff)
+                eerr = max(abs(a-b) for a, b in zip(out, bx))
+                line = '{:7d} {:7.3f} {:8d}'.format(err, sum(diff)/nsamp, eerr)
+                err = max(err, eerr)
+            worst = max(worst, err)
+            print('{:6s} {:8.3f} {:6d} {:4d} {:9.1f} {:9.1f} {:9.2f} {}'.format(
+                name, w['pars'][0], nsamp, dup, t_float*1e6, t_fixed*1e6, t_float/t_fixed, line))
+    print('worst deviation: {} LSB'.format(worst))
+    if worst > 2:
+        print('ERROR: fixed point path deviates by more than two LSB')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
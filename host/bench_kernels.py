@@ -0,0 +1,66 @@
+# Host side benchmark: whole-buffer kernels against the per-sample eval() path
+#
+# run on a PC from the repository root:
+#   python host/bench_kernels.py
+# the per-sample reference is host/ref_wave.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wave_kernels as wk
+import ref_wave as ref
+
+kernels = {ref.sine: wk.fill_sine,
+           ref.pulse: wk.fill_pulse,
+           ref.gaussian: wk.fill_gaussian,
+           ref.sinc: wk.fill_sinc,
+           ref.exponential: wk.fill_exponential,
+           ref.noise: wk.fill_noise}
+
+symmetry = {ref.sine: wk.QUARTER,
+            ref.gaussian: wk.EVEN,
+            ref.sinc: wk.EVEN}
+
+
+def main(repeat=10):
+    print('{:6s} {:>6s} {:>4s} {:>10s} {:>10s} {:>10s} {:>7s} {:>6s}'.format(
+        'func', 'nsamp', 'dup', 'eval us', 'kernel us', 'period us', 'speedup', 'maxLSB'))
+    worst = 0
+    for name, w in ref.waves():
+        kernel = kernels[w['func']]
+        for nsamp, dup in ((512, 1), (508, 3), (512, 8), (4096, 1)):
+            out = bytearray(nsamp)
+            buf = bytearray(nsamp)
+            fill = lambda: kernel(buf, 0, nsamp, nsamp, dup, w['replicate'], w['pars'],
+                                  w['amplitude'], w['offset'], ref.DACbits)
+            t_ref = ref.timeit(lambda: ref.fill(out, w, nsamp, dup), repeat)
+            t_ker = ref.timeit(fill, repeat)
+            if name == 'noise':
+                t_tile = t_ker
+            else:
+                t_tile = ref.timeit(lambda: wk.fill_periodic(kernel, buf, nsamp, dup, w['replicate'], w['pars'],
+                                                             w['amplitude'], w['offset'], ref.DACbits,
+                                                             symmetry.get(w['func'], 0)), repeat)
+                out2 = bytearray(nsamp)
+                kernel(out2, 0, nsamp, nsamp, dup, w['replicate'], w['pars'], w['amplitude'], w['offset'], ref.DACbits)
+                if out2 != buf:
+                    print('  tiled/symmetric fill differs from the plain kernel by {} LSB'.format(
+                        max(abs(a-b) for a, b in zip(out2, buf))))
+            if name == 'noise':     # own generator, statistics in host/bench_noise.py
+                err = 0
+            else:
+                ref.fill(out, w, nsamp, dup)
+                fill()
+                err = max(abs(a-b) for a, b in zip(out, buf))
+            worst = max(worst, err)
+            print('{:6s} {:6d} {:4d} {:10.1f} {:10.1f} {:10.1f} {:7.2f} {:6d}'.format(
+                name, nsamp, dup, t_ref*1e6, t_ker*1e6, t_tile*1e6, t_ref/min(t_ker, t_tile), err))
+    if worst > 1:
+        print('ERROR: kernels deviate by more than one LSB')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Host side benchmark: table driven sine/sinc fill against the per-sample path
+#
+# run on a PC from the repository root:
+#   python host/bench_lut.py
+# the per-sample reference is host/ref_wave.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wave_lut import fill_sine, fill_sinc
+import ref_wave as ref
+
+DACbits = ref.DACbits
+
+
+def main(repeat=20):
+    cases = (
+        ('sine', ref.sine, [0.2, 0.4, 0.2], 0.48, 0.5, 1),
+        ('sine', ref.sine, [0.2, 0.4, 0.2], 0.48, 0.5, -1),
+        ('sinc', ref.sinc, [0.04, 0.4, 0.2], 0.5, 0.5, 1),
+        ('sinc', ref.sinc, [0.005, 0.4, 0.2], 0.5, 0.5, 1),
+    )
+    print('{:6s} {:>6s} {:>4s} {:>4s} {:>10s} {:>10s} {:>7s} {:>6s}'.format(
+        'func', 'nsamp', 'dup', 'rep', 'ref us', 'table us', 'speedup', 'maxLSB'))
+    for name, f, pars, amp, off, rep in cases:
+        for nsamp, dup in ((512, 1), (512, 3), (256, 1), (4096, 1)):
+            w = {'func': f, 'pars': pars, 'amplitude': amp, 'offset': off, 'replicate': rep}
+            out = bytearray(nsamp)
+            tab = bytearray(nsamp)
+            if name == 'sine':
+                fill = lambda: fill_sine(tab, 0, nsamp, nsamp, dup, rep, pars, amp, off, DACbits)
+            else:
+                fill = lambda: fill_sinc(tab, 0, nsamp, nsamp, dup, rep, pars, amp, off, DACbits)
+            t_ref = ref.timeit(lambda: ref.fill(out, w, nsamp, dup), repeat)
+            t_tab = ref.timeit(fill, repeat)
+            err = max(abs(a-b) for a, b in zip(out, tab))
+            print('{:6s} {:6d} {:4d} {:4d} {:10.1f} {:10.1f} {:7.2f} {:6d}'.format(
+                name, nsamp, dup, rep, t_ref*1e6, t_tab*1e6, t_ref/t_tab, err))
+            if err > 1:
+                print('  ERROR: table path deviates by more than one LSB')
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# Host side benchmark and statistics of the noise engine (wave_noise)
+#
+# run on a PC from the repository root:
+#   python host/bench_noise.py
+# times the sum-of-random() noise (per-sample eval path and the former float
+# kernel) against the integer engine, and checks the engine output:
+# mean and standard deviation of the DAC codes, lag-1 correlation (white noise ~0),
+# the variance left after averaging blocks of 64 samples (white ~1/64, pink much more)
+# and that seed() reproduces a buffer.
+# CPython runs random() in C, on the RP2040 the old path also allocates a list per sample.
+
+import os
+import sys
+from random import random
+from math import sqrt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wave_noise as wn
+import ref_wave as ref
+
+
+#the float kernel wave_kernels.fill_noise had before the noise engine
+def fill_noise_random(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    n=pars[0]
+    a=(1<<dacbits)*amplitude*sqrt(12/n)
+    b=(1<<dacbits)*offset-0.5*n*a
+    rnd=random
+    for isamp in range(start,stop):
+        s=0.0
+        for _ in range(n):
+            s+=rnd()
+        v=int(s*a+b)
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+
+
+def stats(buf):
+    n = len(buf)
+    m = sum(buf)/n
+    d = [v-m for v in buf]
+    var = sum(v*v for v in d)/n
+    lag1 = sum(d[i]*d[i+1] for i in range(n-1))/n/var
+    k = 64
+    means = [sum(d[i:i+k])/k for i in range(0, n-k+1, k)]
+    blockvar = sum(v*v for v in means)/len(means)/var
+    return m, sqrt(var), lag1, blockvar
+
+
+def main(repeat=10):
+    amplitude, offset = 0.15, 0.5
+    print('{:8s} {:>6s} {:>10s} {:>10s} {:>10s} {:>8s}'.format(
+        'noise', 'nsamp', 'eval us', 'random us', 'engine us', 'speedup'))
+    for n in (1, 3, 8):
+        w = {'func': ref.noise, 'pars': [n], 'amplitude': amplitude, 'offset': offset, 'replicate': 1}
+        for nsamp in (512, 4096):
+            buf = bytearray(nsamp)
+            args = (0, nsamp, nsamp, 1, 1, [n], amplitude, offset, ref.DACbits)
+            t_eval = ref.timeit(lambda: ref.fill(buf, w, nsamp, 1), repeat)
+            t_rnd = ref.timeit(lambda: fill_noise_random(buf, *args), repeat)
+            t_eng = ref.timeit(lambda: wn.fill_noise(buf, *args), repeat)
+            print('{:8s} {:6d} {:10.1f} {:10.1f} {:10.1f} {:8.2f}'.format(
+                'sum{}'.format(n), nsamp, t_eval*1e6, t_rnd*1e6, t_eng*1e6, t_eval/t_eng))
+    for name, kernel in (('gauss', wn.fill_gnoise), ('pink', wn.fill_pink)):
+        buf = bytearray(4096)
+        t = ref.timeit(lambda: kernel(buf, 0, 4096, 4096, 1, 1, [0], amplitude, offset, ref.DACbits), repeat)
+        print('{:8s} {:6d} {:>10s} {:>10s} {:10.1f}'.format(name, 4096, '-', '-', t*1e6))
+
+    print()
+    print('{:8s} {:>8s} {:>8s} {:>8s} {:>8s}'.format('noise', 'mean', 'std', 'lag1', 'block64'))
+    want_m, want_s = offset*256, amplitude*256
+    failed = False
+    cases = (('sum1', wn.fill_noise, [1]), ('sum3', wn.fill_noise, [3]), ('sum8', wn.fill_noise, [8]),
+             ('gauss', wn.fill_gnoise, [0]), ('pink', wn.fill_pink, [0]))
+    for name, kernel, pars in cases:
+        buf = bytearray(1 << 16)
+        kernel(buf, 0, len(buf), len(buf), 1, 1, pars, amplitude, offset, ref.DACbits)
+        m, s, lag1, blockvar = stats(buf)
+        print('{:8s} {:8.2f} {:8.2f} {:8.3f} {:8.4f}'.format(name, m, s, lag1, blockvar))
+        if abs(m-want_m) > 1 or abs(s-want_s) > 0.05*want_s:
+            print('  ERROR: expected mean {:.1f} and std {:.1f}'.format(want_m, want_s))
+            failed = True
+        if name != 'pink' and (abs(lag1) > 0.02 or blockvar > 2/64):
+            print('  ERROR: white noise is correlated')
+            failed = True
+        if name == 'pink' and blockvar < 10/64:
+            print('  ERROR: pink noise has no excess low frequency power')
+            failed = True
+
+    a, b = bytearray(4096), bytearray(4096)
+    for kernel in (wn.fill_noise, wn.fill_gnoise, wn.fill_pink):
+        wn.seed(1234)
+        kernel(a, 0, 4096, 4096, 1, 1, [3], amplitude, offset, ref.DACbits)
+        wn.seed(1234)
+        kernel(b, 0, 4096, 4096, 1, 1, [3], amplitude, offset, ref.DACbits)
+        if a != b:
+            print('ERROR: seed() does not reproduce', kernel.__name__)
+            failed = True
+    if failed:
+        sys.exit(1)
+    print('seed() reproduces all noise buffers')
+
+
+if __name__ == '__main__':
+    main()
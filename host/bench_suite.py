@@ -0,0 +1,152 @@
+# Benchmark suite of setupwave with regression thresholds
+#
+# run on a PC from the repository root, wave_gen runs on the emulated Pico (host/emu):
+#   python host/bench_suite.py --out base.json                 # record
+#   python host/bench_suite.py --out new.json --compare base.json
+# sweeps every waveform of wave_gen over frequencies from 1 Hz to 20 MHz and
+# buffer sizes (maxsamp), each set up starts cold (empty cache, no stored shape,
+# no measured fill rate).
+# per case: fill time (best of --repeat), samples/s, bytes allocated during the
+# set up and the relative error of the output frequency, taken from the clock
+# divider the emulated PIO runs with.
+# --compare exits with 1 when a case got slower than --time-tol times the baseline
+# (plus --time-slack us) or its frequency error grew by more than --ferr-tol.
+
+import argparse
+import json
+import os
+import sys
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import emu
+emu.install()
+
+import utime
+import wave_gen as wg
+import ref_wave
+
+FREQUENCIES = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000, 20000000)
+SIZES = (256, 512, 1024, 2048)
+
+
+def set_maxsamp(n):
+    wg.maxsamp = n
+    wg.shape = array('H', bytearray(2*n))
+
+
+def cold():
+    wg.stopDMA()
+    wg.cache.clear()
+    wg.fill_rates.clear()
+    wg.last_shape = None
+    wg.shape_key = None
+    wg.playing_key = None
+
+
+# bytes allocated while fn runs
+def allocated(fn):
+    try:
+        import tracemalloc
+    except ImportError:     # MicroPython
+        import gc
+        gc.collect()
+        gc.disable()
+        a = gc.mem_alloc()
+        fn()
+        n = gc.mem_alloc()-a
+        gc.enable()
+        return n
+    tracemalloc.start()
+    fn()
+    n = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return n
+
+
+def run_case(w, maxsamp, repeat):
+    set_maxsamp(maxsamp)
+    buf = bytearray(maxsamp)
+    best = None
+    for _ in range(repeat):
+        cold()
+        t0 = utime.ticks_us()
+        wg.setupwave(buf, w)
+        dt = utime.ticks_diff(utime.ticks_us(), t0)
+        best = dt if best is None or dt < best else best
+    cold()
+    nsamp, dup, clkdiv = wg.planwave(w)     # the plan of a cold set up, before a fill rate is measured
+    alloc = allocated(lambda: wg.setupwave(buf, w))
+    f_out = dup/(emu.period()*nsamp)
+    wg.stopDMA()
+    return {'fill_us': best, 'samples_per_s': int(nsamp*1e6/max(best, 1)), 'alloc_bytes': alloc,
+            'nsamp': nsamp, 'dup': dup, 'clkdiv': clkdiv, 'F_out': f_out,
+            'F_error': abs(f_out-w['frequency'])/w['frequency']}
+
+
+def run(repeat, funcs=None, sizes=SIZES, frequencies=FREQUENCIES):
+    wg.stream_noise = False
+    results = {}
+    print('{:7s} {:>9s} {:>5s} {:>6s} {:>4s} {:>6s} {:>9s} {:>10s} {:>8s} {:>10s}'.format(
+        'func', 'f Hz', 'max', 'nsamp', 'dup', 'clkdiv', 'fill us', 'samples/s', 'alloc', 'F error'))
+    for name, w in ref_wave.waves(wg):
+        if funcs and name not in funcs:
+            continue
+        for maxsamp in sizes:
+            for f in frequencies:
+                w = dict(w)
+                w['frequency'] = f
+                r = run_case(w, maxsamp, repeat)
+                results['{}/{}/{}'.format(name, f, maxsamp)] = r
+                print('{:7s} {:9d} {:5d} {:6d} {:4d} {:6d} {:9d} {:10d} {:8d} {:10.2e}'.format(
+                    name, f, maxsamp, r['nsamp'], r['dup'], r['clkdiv'], r['fill_us'],
+                    r['samples_per_s'], r['alloc_bytes'], r['F_error']))
+    set_maxsamp(512)
+    return results
+
+
+def compare(results, base, time_tol, time_slack, ferr_tol):
+    worse = []
+    for key, r in results.items():
+        b = base.get(key)
+        if b is None:
+            continue
+        if r['fill_us'] > b['fill_us']*time_tol+time_slack:
+            worse.append('{}: fill {} us, was {} us'.format(key, r['fill_us'], b['fill_us']))
+        if r['F_error'] > b['F_error']+ferr_tol:
+            worse.append('{}: frequency error {:.2e}, was {:.2e}'.format(key, r['F_error'], b['F_error']))
+    missing = [k for k in base if k not in results]
+    return worse, missing
+
+
+def main():
+    ap = argparse.ArgumentParser(description='setupwave benchmark suite')
+    ap.add_argument('--out', help='write the results to this json file')
+    ap.add_argument('--compare', help='baseline json file to compare against')
+    ap.add_argument('--repeat', type=int, default=5, help='timed set ups per case, the best counts')
+    ap.add_argument('--func', action='append', help='only this waveform, can be repeated')
+    ap.add_argument('--time-tol', type=float, default=1.25, help='allowed fill time ratio to the baseline')
+    ap.add_argument('--time-slack', type=float, default=50, help='allowed extra fill time in us')
+    ap.add_argument('--ferr-tol', type=float, default=1e-6, help='allowed growth of the relative frequency error')
+    args = ap.parse_args()
+
+    results = run(args.repeat, args.func)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'fclock': wg.fclock, 'results': results}, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)['results']
+        worse, missing = compare(results, base, args.time_tol, args.time_slack, args.ferr_tol)
+        for line in worse:
+            print('REGRESSION', line)
+        if missing and not args.func:
+            print('{} baseline cases not run'.format(len(missing)))
+        if worse:
+            sys.exit(1)
+        print('no regressions against {} ({} cases)'.format(args.compare, len(results)))
+
+
+if __name__ == '__main__':
+    main()
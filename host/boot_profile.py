@@ -0,0 +1,115 @@
+# Profile the boot of the AWG on a PC with the emulated Pico (host/emu)
+#
+# run from the repository root:
+#   python host/boot_profile.py
+# the sine the ui starts with (2000 Hz) is saved as the last wave of a temporary
+# wave library, then two fresh interpreters boot to the first output sample:
+#   fast   wave_boot.resume: arena, wave_gen and the samples read back with readinto
+#   calc   arena, wave_gen and the wave calculated by setupwave_db, as ui did
+# each prints the wave_boot report, every import with its time and the bytes it
+# allocated (tracemalloc stands in for gc.mem_alloc), and the ms to the first output.
+# json is a file import here, it is built into MicroPython.
+# hardware_setup and the gui don't run on a PC: what deferring the gui imports saves
+# is measured on the Pico, with boot_profile=True in wave_config.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import emu
+emu.install()
+
+import wave_config
+
+UI_WAVE = {'func': 'sine', 'frequency': 2000, 'amplitude': 0.48, 'offset': 0.5,
+           'phase': 0, 'replicate': 1, 'pars': [0.2, 0.4, 0.2]}
+
+
+def ui_wave(wg):
+    from wave_spec import Wave
+    w = dict(UI_WAVE)
+    w['func'] = getattr(wg, w['func'])
+    return Wave(**w)
+
+
+# the last wave the ui left, in a new library
+def prepare(store):
+    wave_config.store_dir = store
+    import wave_arena
+    import wave_gen as wg
+    import wave_boot
+    arena = wave_arena.Arena(wave_config.maxsamp, 2)
+    w = ui_wave(wg)
+    wg.setupwave_db(arena.bufs, w)
+    wave_boot.remember(w)
+    wg.stopDMA()
+
+
+# runs in its own interpreter, so every import is a first one
+def child(path, store):
+    import tracemalloc
+    tracemalloc.start()
+    wave_config.store_dir = store
+    import wave_boot
+    wave_boot.mem_alloc = lambda: tracemalloc.get_traced_memory()[0]
+    wave_boot.profile()
+    wave_boot.mark('boot')
+    if path == 'fast':
+        w = wave_boot.resume()
+    else:
+        import wave_arena
+        arena = wave_arena.allocate(2)
+        wave_boot.mark('arena')
+        import wave_gen as wg
+        w = ui_wave(wg)
+        wg.setupwave_db(arena.bufs, w)
+        wave_boot.mark('first output')
+    wave_boot.unprofile()
+    import wave_arena
+    import wave_gen as wg
+    print(wave_boot.report())
+    marks = dict(wave_boot.marks)
+    ok = w is not None and 'first output' in marks
+    # wave_gen was imported after the arena, it sizes its set ups from it
+    arena = wave_arena.arena
+    good = arena is not None and wg.arena is arena and wg.maxsamp == arena.size > wave_config.maxsamp
+    good = good and wg.ring_dma and len(wg.shape) == arena.size
+    print('{}: wave_gen arena of {} samples, maxsamp {}, {}'.format(
+        path, arena.size if arena else 0, wg.maxsamp, 'ok' if good else 'ERROR'))
+    ok = ok and good
+    if ok:
+        samples = bytes(wg.playing[:w['nsamp']])
+        out = emu.capture(3*len(samples))
+        ok = samples in out and abs(w['F_out']-UI_WAVE['frequency']) < 0.01*UI_WAVE['frequency']
+        print('{}: first output {} ms after boot, set up {} ms, {} samples at {:.2f} Hz, {}'.format(
+            path, marks['first output']-marks['boot'], marks['first output']-marks['arena'],
+            len(samples), w['F_out'], 'ok' if ok else 'ERROR'))
+    else:
+        print('{}: no output ERROR'.format(path))
+    wg.stopDMA()
+    sys.exit(0 if ok else 1)
+
+
+def main():
+    if len(sys.argv) == 3:
+        child(sys.argv[1], sys.argv[2])
+    store = tempfile.mkdtemp()
+    try:
+        prepare(store)
+        failed = False
+        for path in ('fast', 'calc'):
+            print()
+            r = subprocess.run([sys.executable, os.path.abspath(__file__), path, store])
+            failed = failed or r.returncode != 0
+    finally:
+        shutil.rmtree(store)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
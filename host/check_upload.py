@@ -0,0 +1,148 @@
+# Check the USB serial upload (wave_upload, host/upload_wave.py) over a pseudo-terminal
+#
+# run on a PC (Linux, macOS) from the repository root:
+#   python host/check_upload.py
+# the Pico side runs in a thread on the emulated Pico (host/emu) and reads the master
+# of a pty, the uploader writes to its terminal like to /dev/ttyACM0. Uploads have to
+# play exactly the samples sent at the requested frequency: with two buffers, with a
+# chunk corrupted on the way (resent), with text printed in between, too many samples
+# (refused, the old wave keeps playing) and a whole buffer, whose rate is reported.
+
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import emu
+emu.install()
+
+import wave_arena
+import wave_gen as wg
+from wave_config import maxsamp
+from wave_spec import Wave
+from wave_upload import Uploader
+import upload_wave as up
+
+STALE = 4*(emu.hw.FIFO_DEPTH+1)     # samples that can be left in the PIO from a previous wave
+
+
+class Device(threading.Thread):
+
+    def __init__(self, fd, bufs, w):
+        threading.Thread.__init__(self, daemon=True)
+        self.rx = os.fdopen(fd, 'rb', buffering=0)
+        self.tx = os.fdopen(os.dup(fd), 'wb', buffering=0)
+        self.uploader = Uploader(self.rx, self.tx)
+        self.bufs = bufs
+        self.w = w
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.uploader.poll(self.bufs, self.w)
+            time.sleep(0.001)
+
+
+# a port that corrupts one byte of the count-th write from now
+class Noisy:
+
+    def __init__(self, port, count):
+        self.port = port
+        self.count = count
+
+    def write(self, data):
+        self.count -= 1
+        if self.count == 0:
+            data = bytearray(data)
+            data[len(data)//2] ^= 0x55
+        self.port.write(data)
+
+    def read(self, timeout):
+        return self.port.read(timeout)
+
+
+def plays(samples, w):
+    out = emu.capture(maxsamp+3*len(samples)+STALE)    # the old wave ends its pass first
+    k = out.find(samples)
+    return 0 <= k <= maxsamp+STALE and out[k:k+2*len(samples)] == samples*2
+
+
+def main():
+    master, slave = os.openpty()
+    arena = wave_arena.Arena(maxsamp, 2)
+    w = Wave(func=wg.sine, pars=[0.2, 0.4, 0.2], amplitude=0.48, offset=0.5, frequency=1000)
+    wg.setupwave_db(arena.bufs, w)
+    device = Device(master, arena.bufs, w)
+    device.start()
+    port = up.open_port(os.ttyname(slave))
+    link = up.Link(port)
+    rnd = random.Random(1)
+    ok = True
+
+    samples = bytes(rnd.randrange(256) for _ in range(300))
+    r = up.upload(link, samples, 2000, periods=2, chunk=64)
+    good = plays(samples, w) and w['func'] is wg.arbitrary and abs(w['F_out']/2000-1) < 0.01
+    print('upload {} samples of 2 periods: F_out {:.1f} Hz, {}'.format(
+        len(samples), w['F_out'], 'ok' if good else 'ERROR'))
+    ok = ok and good
+
+    link.port = Noisy(port, 4)     # magic, header, the first chunk, the second
+    samples = bytes(rnd.randrange(256) for _ in range(256))
+    r = up.upload(link, samples, 5000, chunk=64)
+    good = plays(samples, w) and r['resends'] == 1 and device.uploader.resends == 1
+    print('corrupted chunk: {} resent, {}'.format(r['resends'], 'ok' if good else 'ERROR'))
+    ok = ok and good
+    link.port = port
+
+    device.tx.write(b'0: text printed by the Pico\r\n')
+    samples = bytes(range(0, 256, 2))
+    up.upload(link, samples, 10000)
+    good = plays(samples, w) and b'printed by the Pico' in link.text
+    print('text in between skipped: {}'.format('ok' if good else 'ERROR'))
+    ok = ok and good
+
+    try:
+        up.upload(link, bytes(maxsamp+4), 1000)
+        good = False
+    except up.UploadError:
+        good = plays(samples, w) and device.uploader.error.startswith('refused')
+    print('{} samples refused, old wave plays: {}'.format(maxsamp+4, 'ok' if good else 'ERROR'))
+    ok = ok and good
+
+    w['frequency'] = 20000
+    key = wg.playing_key
+    wg.setupwave_db(arena.bufs, w)
+    good = plays(samples, w) and wg.playing_key == key and abs(w['F_out']/20000-1) < 0.01
+    print('new frequency, same samples: {}'.format('ok' if good else 'ERROR'))
+    ok = ok and good
+
+    # the ui adjusters write pars in place, the upload doesn't depend on them
+    w['pars'][1] = 0.5
+    wg.setupwave_db(arena.bufs, w)
+    good = plays(samples, w) and w['pars'] == [0.2, 0.5, 0.2] and abs(w['F_out']/20000-1) < 0.01
+    print('pars changed by an adjuster, same upload: {}'.format('ok' if good else 'ERROR'))
+    ok = ok and good
+
+    samples = bytes(rnd.randrange(256) for _ in range(maxsamp))
+    best = 0
+    for _ in range(5):
+        r = up.upload(link, samples, 1000)
+        best = max(best, r['rate'])
+    good = plays(samples, w)
+    print('{} samples, chunk {}: {:.0f} kB/s over the pty, {}'.format(
+        maxsamp, up.CHUNK, best/1000, 'ok' if good else 'ERROR'))
+    ok = ok and good
+
+    device.running = False
+    device.join()
+    wg.stopDMA()
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+# Check the second core worker (wave_worker) with ordinary threads on a PC
+#
+# run from the repository root:
+#   python host/check_worker.py
+# every waveform is calculated by a single core and split over two threads, in
+# both synthesis modes and over sample counts and duplications, and the samples
+# have to be identical. Then the chunked async set up hands its fill to the worker
+# and has to produce the same buffer while the event loop keeps running, and a
+# cache hit and a sequence have to wait for a job left on the worker.
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import emu
+emu.install()
+
+import wave_gen as wg
+import wave_noise
+from wave_async import setupwave_async, makewave_async
+from wave_worker import Worker
+from wave_seq import Sequence
+import ref_wave
+
+CASES = ((512, 1), (2048, 1), (500, 4), (1564, 1), (100, 16), (1024, 3))
+
+
+def fill(w, nsamp, dup, worker):
+    wg.set_worker(worker)
+    wave_noise.seed(1)
+    buf = bytearray(nsamp)
+    wg.fillwave(buf, w, nsamp, dup)
+    wg.set_worker(None)
+    return bytes(buf)
+
+
+def check_split(worker):
+    failed = 0
+    for mode in ('float', 'fixed'):
+        wg.set_synth(mode)
+        for name, w in ref_wave.waves(wg):
+            for nsamp, dup in CASES:
+                one = fill(w, nsamp, dup, None)
+                two = fill(w, nsamp, dup, worker)
+                if one != two:
+                    failed += 1
+                    print('{} {} nsamp {} dup {}: split fill differs'.format(mode, name, nsamp, dup))
+    wg.set_synth('float')
+    print('split fills: {} cases, {} jobs on the worker, {} differ'.format(
+        2*len(ref_wave.waves(wg))*len(CASES), worker.jobs, failed))
+    return failed == 0
+
+
+def check_async(worker):
+    wg.stream_noise = False
+    name, w = ref_wave.waves(wg)[2]
+    w = dict(w, frequency=100)
+    nsamp, dup, clkdiv = wg.planwave(w)
+    buf = bytearray(wg.maxsamp)
+    wg.makewave(buf, w, nsamp, dup, clkdiv)     # a calculated set up, the shape rescaled
+    ref = bytes(buf[:nsamp])
+    wg.cache.clear()
+    wg.last_shape = wg.shape_key = None
+    bufs = {0: bytearray(wg.maxsamp), 1: bytearray(wg.maxsamp)}
+    wg.set_worker(worker)
+    turns = []
+
+    async def other():
+        while True:
+            turns.append(1)
+            await asyncio.sleep(0)
+
+    async def run():
+        gui = asyncio.create_task(other())
+        await setupwave_async(bufs, w)
+        gui.cancel()
+
+    jobs = worker.jobs
+    asyncio.run(run())
+    wg.set_worker(None)
+    ok = bytes(wg.playing[:nsamp]) == ref and worker.jobs == jobs+1 and w['AWG_status'] == 'running'
+    print('async set up on the worker: {} event loop turns, {}'.format(len(turns), 'ok' if ok else 'ERROR'))
+    wg.stopDMA()
+    return ok
+
+
+def check_stale(worker):
+    wg.stream_noise = False
+    name, w = ref_wave.waves(wg)[0]
+    w = dict(w, frequency=1000)
+    nsamp, dup, clkdiv = wg.planwave(w)
+    buf = bytearray(wg.maxsamp)
+    wg.makewave(buf, w, nsamp, dup, clkdiv)     # in the cache from now on
+    ref = bytes(buf[:nsamp])
+    wg.last_shape = wg.shape_key = None
+
+    def stale(buf):     # the fill of a cancelled set up, finishing late
+        time.sleep(0.05)
+        buf[:nsamp] = bytes(nsamp)
+
+    wg.set_worker(worker)
+    worker.submit(stale, (buf,))
+    path = asyncio.run(makewave_async(buf, w, nsamp, dup, clkdiv, None))
+    worker.join()
+    wg.set_worker(None)
+    ok = path == 'cache' and bytes(buf[:nsamp]) == ref
+    print('cache hit after a cancelled fill on the worker: {}'.format('ok' if ok else 'ERROR'))
+    return ok
+
+
+def check_sequence(worker):
+    pool = bytearray(4096)
+    sine = dict(ref_wave.waves(wg)[0][1], frequency=10000)
+    seq = Sequence(1000000).wave(sine, 5)
+
+    def stale(buf):     # the fill of a set up that skipped the worker join, finishing late
+        time.sleep(0.05)
+        buf[:100] = bytes(100)
+
+    wg.set_worker(worker)
+    worker.submit(stale, (memoryview(pool),))
+    seq.play(pool)
+    time.sleep(0.1)
+    n = seq.periods[0]
+    want = bytearray(n)
+    wg.fillwave(want, sine, n, 1)
+    ok = pool[:n] == want and bytes(want) in emu.capture(3*n) and wg.sequencing
+    worker.join()
+    wg.set_worker(None)
+    print('sequence after a late job on the worker: {}'.format('ok' if ok else 'ERROR'))
+    wg.stopDMA()
+    return ok
+
+
+def main():
+    worker = Worker()
+    ok = check_split(worker)
+    ok = check_async(worker) and ok
+    ok = check_stale(worker) and ok
+    ok = check_sequence(worker) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
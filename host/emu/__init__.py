@@ -0,0 +1,52 @@
+# Host emulation of the MicroPython modules wave_gen needs on the Pico
+#
+# Lets wave_gen, and with it setupwave and the DMA code, run on a PC under
+# CPython or the unix port of MicroPython:
+#   import emu
+#   emu.install()           # before the first import of wave_gen
+#   import wave_gen
+#   wave_gen.setupwave(buf, w)
+#   samples = emu.capture(1024)     # DAC codes the PIO puts on the pins
+#   a, b = emu.capture2(1024)       # and of state machine 1 in the same time
+# machine.mem32 goes to an emulated DMA controller and PIO state machine (emu.hw),
+# uctypes.addressof to an emulated address space that checks every DMA access.
+# utime is only replaced where the host has none.
+
+import sys
+
+from emu import hw
+
+
+def install(fclock=125000000):
+    from emu import machine, rp2, uctypes
+    hw.bus.fclock = fclock
+    sys.modules['machine'] = machine
+    sys.modules['rp2'] = rp2
+    sys.modules['uctypes'] = uctypes
+    try:
+        import utime
+    except ImportError:
+        from emu import utime
+        sys.modules['utime'] = utime
+
+
+# the next nsamp samples of the output, the DMA moves along as the PIO pulls words
+def capture(nsamp):
+    return hw.bus.pio.run(nsamp)
+
+
+# nsamp samples of state machine 0 and the samples state machine 1 put out meanwhile
+def capture2(nsamp):
+    a = hw.bus.pio.run(nsamp)
+    return a, bytes(hw.bus.pio.sm[1].out)
+
+
+# seconds per sample at the clock divider the state machine runs with
+def period():
+    return hw.bus.period()
+
+
+def stats():
+    sm = hw.bus.pio.sm[0]
+    return {'samples': sm.samples, 'stalls': sm.stalls, 'clkdiv': sm.divider(),
+            'seconds': sm.cycles/256/hw.bus.fclock, 'intr': hw.bus.dma.intr}
@@ -0,0 +1,336 @@
+# Emulated RP2040 hardware for host/emu: memory, DMA channels and the PIO state machine
+#
+# memory  addressof() hands out a made-up address per buffer object, with a gap
+#         between buffers, and the DMA reads and writes through it. A memoryview
+#         slice gets the address inside its buffer (CPython), so alignment is real.
+#         A transfer outside every buffer raises MemoryError instead of reading garbage.
+# DMA     the channel registers startDMA/stopDMA/switchDMA write: READ_ADDR,
+#         WRITE_ADDR, TRANS_COUNT (reload value, reads give the live count),
+#         CTRL_TRIG, AL1_CTRL, the raw INTR flags, chaining and address rings.
+#         Unpaced channels (TREQ 0x3f) run to completion when triggered, channels
+#         paced by PIO0_TX0 only move when the state machine pulls a word.
+# PIO     the 4 state machines of PIO0 running wave_gen.stream: every pulled 32 bit
+#         word is shifted out as 4 samples, lowest byte first, each lasting CLKDIV
+#         cycles. With no word available the pins hold the last sample (a stall).
+#         CTRL enables them, with CLKDIV_RESTART the ones written start in step.
+#         Toggling FJOIN_RX or FJOIN_TX in SHIFTCTRL flushes the FIFO.
+#         run() clocks state machine 0, the others run alongside for the same time.
+# Time only passes in run(), CPU waits on DMA registers return after their loop bound.
+
+DMA_BASE = 0x50000000
+DMA_CHANNELS = 12
+DMA_INTR = DMA_BASE+0x400
+PIO0_BASE = 0x50200000
+PIO0_CTRL = PIO0_BASE+0x000
+PIO0_TXF0 = PIO0_BASE+0x10
+PIO0_SM0_CLKDIV = PIO0_BASE+0xc8
+PIO_SMS = 4
+SM_STRIDE = 0x18    # between the register blocks of the state machines
+SM_REGS = {0x00: 'clkdiv', 0x08: 'shiftctrl'}
+FJOIN = 3 << 30
+SRAM_BASE = 0x20000000
+DREQ_PIO0_TX0 = 0
+TREQ_UNPACED = 0x3f
+FIFO_DEPTH = 4
+
+# channel register offsets and their aliases, a TRANS_COUNT write sets the reload value
+CHANNEL_REGS = {0x00: 'read', 0x04: 'write', 0x08: 'reload', 0x0c: 'ctrl',
+                0x10: 'ctrl', 0x14: 'read', 0x18: 'write', 0x1c: 'reload',
+                0x20: 'ctrl', 0x24: 'reload', 0x28: 'read', 0x2c: 'write',
+                0x30: 'ctrl', 0x34: 'write', 0x38: 'reload', 0x3c: 'read'}
+TRIGGER_REGS = (0x0c, 0x1c, 0x2c, 0x3c)
+
+
+# byte offset of a memoryview into its underlying object, None where it can't be found
+def view_offset(view):
+    try:
+        import ctypes
+        return ctypes.addressof(ctypes.c_char.from_buffer(view))-ctypes.addressof(ctypes.c_char.from_buffer(view.obj))
+    except (ImportError, TypeError, ValueError):
+        return None
+
+
+class Memory:
+
+    def __init__(self):
+        self.regions = []       # (base, bytes, obj, item size)
+        self.bases = {}         # id(obj) -> base, obj is kept alive by regions
+        self.next = SRAM_BASE
+        self.last = None
+
+    def addressof(self, obj):
+        if isinstance(obj, memoryview) and obj.obj is not None:
+            off = view_offset(obj)
+            if off is not None:     # a slice lies inside the buffer it was taken from
+                return self.addressof(obj.obj)+off
+        base = self.bases.get(id(obj))
+        if base is None:
+            n = len(bytes(obj))
+            size = n//len(obj) if len(obj) else 1
+            base = self.next
+            self.next = (base+n+64+15) & ~15    # gap, so an overrun hits no buffer
+            self.bases[id(obj)] = base
+            self.regions.append((base, n, obj, size))
+        return base
+
+    def find(self, addr, n):
+        r = self.last
+        if r is None or not r[0] <= addr <= r[0]+r[1]-n:
+            for r in self.regions:
+                if r[0] <= addr <= r[0]+r[1]-n:
+                    break
+            else:
+                raise MemoryError('emulated access of {} bytes outside any buffer at 0x{:08x}'.format(n, addr))
+            self.last = r
+        return addr-r[0], r[2], r[3]
+
+    def read(self, addr, n):
+        off, obj, size = self.find(addr, n)
+        if size == 1:
+            v = 0
+            for i in range(n):
+                v |= obj[off+i] << (8*i)
+            return v
+        if size == n:
+            return obj[off//n] & ((1 << (8*n))-1)
+        return int.from_bytes(bytes(obj)[off:off+n], 'little')
+
+    def write(self, addr, n, v):
+        off, obj, size = self.find(addr, n)
+        if size == 1:
+            for i in range(n):
+                obj[off+i] = (v >> (8*i)) & 0xff
+        elif size == n:
+            obj[off//n] = v
+        else:
+            raise NotImplementedError('emulated write of {} bytes into a {} byte array'.format(n, size))
+
+
+class Channel:
+
+    def __init__(self, ch):
+        self.ch = ch
+        self.read = 0
+        self.write = 0
+        self.count = 0      # live transfer count
+        self.reload = 0     # value TRANS_COUNT was written with
+        self.ctrl = 0
+        self.busy = False
+        self.transfers = 0  # all transfers since reset, for statistics
+
+    def field(self, lsb, bits):
+        return (self.ctrl >> lsb) & ((1 << bits)-1)
+
+
+class DMA:
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.ch = [Channel(i) for i in range(DMA_CHANNELS)]
+        self.intr = 0
+
+    def read_reg(self, addr):
+        if addr == DMA_INTR:
+            return self.intr
+        ch, reg = self.decode(addr)
+        if reg == 'ctrl':
+            return ch.ctrl | (ch.busy << 24)
+        if reg == 'reload':
+            return ch.count
+        return getattr(ch, reg)
+
+    def write_reg(self, addr, v):
+        if addr == DMA_INTR:
+            self.intr &= ~v
+            return
+        ch, reg = self.decode(addr)
+        setattr(ch, reg, v & 0x00ffffff if reg == 'ctrl' else v)
+        if (addr-DMA_BASE) & 0x3f in TRIGGER_REGS:
+            self.trigger(ch.ch)
+
+    def decode(self, addr):
+        off = addr-DMA_BASE
+        n = off >> 6
+        if not 0 <= n < DMA_CHANNELS or off & 3:
+            raise MemoryError('no emulated DMA register at 0x{:08x}'.format(addr))
+        return self.ch[n], CHANNEL_REGS[off & 0x3c]
+
+    def trigger(self, n):
+        ch = self.ch[n]
+        if not ch.ctrl & 1:
+            return
+        ch.count = ch.reload
+        ch.busy = True
+        if ch.count == 0:
+            self.complete(ch)
+        elif ch.field(15, 6) == TREQ_UNPACED:
+            while ch.busy and ch.ctrl & 1:
+                self.transfer(ch)
+
+    def transfer(self, ch):
+        size = 1 << ch.field(2, 2)
+        v = self.bus.read(ch.read, size)
+        self.bus.write(ch.write, size, v)
+        if ch.field(4, 1):
+            ch.read = self.step(ch, ch.read, size, 0)
+        if ch.field(5, 1):
+            ch.write = self.step(ch, ch.write, size, 1)
+        ch.count -= 1
+        ch.transfers += 1
+        if ch.count == 0:
+            self.complete(ch)
+
+    def step(self, ch, addr, size, sel):
+        ring = ch.field(6, 4)
+        if ring and ch.field(10, 1) == sel:
+            mask = (1 << ring)-1
+            return (addr & ~mask) | ((addr+size) & mask)
+        return addr+size
+
+    def complete(self, ch):
+        ch.busy = False
+        if not ch.field(21, 1):
+            self.intr |= 1 << ch.ch
+        chain = ch.field(11, 4)
+        if chain != ch.ch:
+            self.trigger(chain)
+
+    # one transfer of a channel paced by dreq, False if none is ready
+    def pace(self, dreq):
+        for ch in self.ch:
+            if ch.busy and ch.ctrl & 1 and ch.field(15, 6) == dreq:
+                self.transfer(ch)
+                return True
+        return False
+
+
+class StateMachine:
+
+    def __init__(self, n):
+        self.n = n
+        self.fifo = []
+        self.clkdiv = 1 << 16
+        self.shiftctrl = 0
+        self.active = False
+        self.pins = 0
+        self.osr = []           # samples of the last pulled word not yet shifted out
+        self.cycles = 0         # 16.8 fixed point system clock cycles, like CLKDIV
+        self.samples = 0
+        self.stalls = 0
+        self.out = bytearray()  # samples of a state machine other than 0 during run()
+
+    # clock divider as a number, 0 stands for 65536
+    def divider(self):
+        d = (self.clkdiv >> 16)+((self.clkdiv >> 8) & 0xff)/256
+        return d or 65536
+
+    def step(self, dma):
+        if not self.osr:
+            while len(self.fifo) < FIFO_DEPTH and dma.pace(DREQ_PIO0_TX0+self.n):
+                pass
+            if self.fifo and self.active:
+                w = self.fifo.pop(0)
+                self.osr = [(w >> 24) & 0xff, (w >> 16) & 0xff, (w >> 8) & 0xff, w & 0xff]
+        if self.osr:
+            self.pins = self.osr.pop()
+        else:
+            self.stalls += 1
+        self.samples += 1
+        self.cycles += self.clkdiv >> 8 or 1 << 24
+        return self.pins
+
+
+class PIO:
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.sm = [StateMachine(n) for n in range(PIO_SMS)]
+
+    def decode(self, addr):
+        off = addr-PIO0_BASE
+        if 0x10 <= off < 0x10+4*PIO_SMS:
+            return 'txf', self.sm[(off-0x10) >> 2]
+        n, r = divmod(off-(PIO0_SM0_CLKDIV-PIO0_BASE), SM_STRIDE)
+        if r in SM_REGS and 0 <= n < PIO_SMS:
+            return SM_REGS[r], self.sm[n]
+        return None, None
+
+    def read_reg(self, addr):
+        if addr == PIO0_CTRL:
+            return sum([sm.active << sm.n for sm in self.sm])
+        reg, sm = self.decode(addr)
+        if reg in ('clkdiv', 'shiftctrl'):
+            return getattr(sm, reg)
+        return 0
+
+    def write_reg(self, addr, v):
+        if addr == PIO0_CTRL:
+            self.control(v)
+            return
+        reg, sm = self.decode(addr)
+        if reg == 'txf':
+            if len(sm.fifo) < FIFO_DEPTH:
+                sm.fifo.append(v)
+        elif reg == 'clkdiv':
+            sm.clkdiv = v & 0xffffff00
+        elif reg == 'shiftctrl':
+            if (sm.shiftctrl ^ v) & FJOIN:
+                sm.fifo = []
+            sm.shiftctrl = v
+
+    # SM_ENABLE in bits 0-3, CLKDIV_RESTART in bits 8-11: the dividers restart
+    # together, their next samples fall on the same clock cycle
+    def control(self, v):
+        restart = [sm for sm in self.sm if v >> (8+sm.n) & 1]
+        if restart:
+            now = max([sm.cycles for sm in self.sm])
+            for sm in restart:
+                sm.cycles = now
+        for sm in self.sm:
+            sm.active = bool(v >> sm.n & 1)
+
+    def run(self, nsamp):
+        out = bytearray(nsamp)
+        dma = self.bus.dma
+        sm0 = self.sm[0]
+        others = [sm for sm in self.sm[1:] if sm.active]
+        for sm in others:
+            sm.out = bytearray()
+        for i in range(nsamp):
+            for sm in others:
+                while sm.cycles <= sm0.cycles:
+                    sm.out.append(sm.step(dma))
+            out[i] = sm0.step(dma)
+        return out
+
+
+class Bus:
+
+    def __init__(self, fclock=125000000):
+        self.fclock = fclock
+        self.memory = Memory()
+        self.dma = DMA(self)
+        self.pio = PIO(self)
+
+    def read(self, addr, n=4):
+        if DMA_BASE <= addr < DMA_BASE+0x1000:
+            return self.dma.read_reg(addr)
+        if PIO0_BASE <= addr < PIO0_BASE+0x1000:
+            return self.pio.read_reg(addr)
+        return self.memory.read(addr, n)
+
+    def write(self, addr, n, v):
+        v &= (1 << (8*n))-1
+        if DMA_BASE <= addr < DMA_BASE+0x1000:
+            self.dma.write_reg(addr, v)
+        elif PIO0_BASE <= addr < PIO0_BASE+0x1000:
+            self.pio.write_reg(addr, v)
+        else:
+            self.memory.write(addr, n, v)
+
+    # seconds per output sample at the current clock divider
+    def period(self):
+        return self.pio.sm[0].divider()/self.fclock
+
+
+bus = Bus()
@@ -0,0 +1,55 @@
+# Stand-in for the MicroPython machine module, see host/emu
+
+from emu.hw import bus
+
+
+class Mem32:
+
+    def __getitem__(self, addr):
+        return bus.read(addr & 0xffffffff, 4)
+
+    def __setitem__(self, addr, v):
+        bus.write(addr & 0xffffffff, 4, v)
+
+
+mem32 = Mem32()
+
+
+def freq(f=None):
+    if f is None:
+        return bus.fclock
+    bus.fclock = f
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state):
+    pass
+
+
+class Pin:
+
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.level = value or 0
+
+    def value(self, v=None):
+        if v is None:
+            return self.level
+        self.level = 1 if v else 0
+
+    __call__ = value
+
+    def on(self):
+        self.level = 1
+
+    def off(self):
+        self.level = 0
@@ -0,0 +1,47 @@
+# Stand-in for the MicroPython rp2 module, see host/emu
+#
+# PIO programs are not assembled, the emulated state machines of PIO0 always run the
+# byte streaming program of wave_gen (see emu.hw.PIO). exec() knows the one
+# instruction wave_gen executes, out(null, 32), that empties the output shift register.
+
+from emu.hw import bus, PIO0_SM0_CLKDIV, PIO_SMS, SM_STRIDE
+
+
+class PIO:
+
+    IN_LOW = 0
+    IN_HIGH = 1
+    OUT_LOW = 2
+    OUT_HIGH = 3
+    SHIFT_LEFT = 0
+    SHIFT_RIGHT = 1
+    JOIN_NONE = 0
+    JOIN_TX = 1
+    JOIN_RX = 2
+
+
+def asm_pio(**kw):
+    def program(f):
+        return f
+    return program
+
+
+class StateMachine:
+
+    def __init__(self, id, prog=None, freq=-1, **kw):
+        if not 0 <= id < PIO_SMS:
+            raise ValueError('only the state machines of PIO0 are emulated')
+        self.sm = bus.pio.sm[id]
+        if freq > 0:
+            div = int(bus.fclock*256/freq)
+            bus.write(PIO0_SM0_CLKDIV+SM_STRIDE*id, 4, (div >> 8) << 16 | (div & 0xff) << 8)
+
+    def active(self, v=None):
+        if v is None:
+            return self.sm.active
+        self.sm.active = bool(v)
+
+    def exec(self, instr):
+        if instr.replace(' ', '') != 'out(null,32)':
+            raise ValueError('emulated exec runs out(null, 32) only')
+        self.sm.osr = []
@@ -0,0 +1,7 @@
+# Stand-in for the MicroPython uctypes module, see host/emu
+
+from emu.hw import bus
+
+
+def addressof(obj):
+    return bus.memory.addressof(obj)
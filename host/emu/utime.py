@@ -0,0 +1,39 @@
+# Stand-in for the MicroPython utime module, see host/emu
+#
+# ticks run on the host clock, so timings of wave_gen code are real
+
+import time
+
+TICKS_PERIOD = 1 << 30
+
+
+def ticks_us():
+    return (time.perf_counter_ns()//1000) % TICKS_PERIOD
+
+
+def ticks_ms():
+    return (time.perf_counter_ns()//1000000) % TICKS_PERIOD
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_diff(a, b):
+    return ((a-b+TICKS_PERIOD//2) % TICKS_PERIOD)-TICKS_PERIOD//2
+
+
+def ticks_add(a, d):
+    return (a+d) % TICKS_PERIOD
+
+
+def sleep(s):
+    time.sleep(s)
+
+
+def sleep_ms(ms):
+    time.sleep(ms/1000)
+
+
+def sleep_us(us):
+    time.sleep(us/1000000)
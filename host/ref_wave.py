@@ -0,0 +1,80 @@
+# Reference per-sample waveform path for host side benchmarks
+#
+# wave_gen needs machine/rp2/uctypes, so this mirrors wave_gen.eval(), the
+# waveform functions and the sample loop of setupwave line by line.
+
+import sys
+from math import pi, sin, exp, sqrt, floor
+from random import random
+
+DACbits = 8
+maxDACvalue = (2**DACbits)-1
+
+
+def eval(w, x):
+    x = x*w['replicate']
+    x = x-floor(x)
+    v = w['func'](x, w['pars'])
+    v = v*w['amplitude']
+    v = v+w['offset']
+    return v
+
+def sine(x, pars):
+    return sin(x*2*pi)
+
+def pulse(x, pars):
+    if x < pars[0]: return x/pars[0]
+    if x < pars[0]+pars[1]: return 1.0
+    if x < pars[0]+pars[1]+pars[2]: return 1.0-(x-pars[0]-pars[1])/pars[2]
+    return 0.0
+
+def gaussian(x, pars):
+    return exp(-((x-0.5)/pars[0])**2)
+
+def sinc(x, pars):
+    if x == 0.5: return 1.0
+    else: return sin((x-0.5)/pars[0])/((x-0.5)/pars[0])
+
+def exponential(x, pars):
+    return exp(-x/pars[0])
+
+def noise(x, pars):
+    return sum([random()-0.5 for _ in range(pars[0])])*sqrt(12/pars[0])
+
+def fill(buf, w, nsamp, dup):
+    for isamp in range(nsamp):
+        buf[isamp] = max(0, min(maxDACvalue, int((2**DACbits)*eval(w, dup*(isamp+0.5)/nsamp))))
+
+
+# the default settings ui.function_cb selects for each function:
+# name, function, pars, amplitude, offset, replicate
+DEFAULTS = (
+    ('sine', 'sine', [0.2, 0.4, 0.2], 0.48, 0.5, 1),
+    ('pulse', 'pulse', [0.05, 0.5, 0.05], 0.89, 0, 1),
+    ('gauss', 'gaussian', [0.2, 0.5, 0.05], 0.55, 0, 1),
+    ('sinc', 'sinc', [0.04, 0.5, 0.05], 0.5, 0.5, 1),
+    ('expo', 'exponential', [0.08, 0.5, 0.05], 0.5, 0, -1),
+    ('noise', 'noise', [3, 0.5, 0.05], 1, 0, 1),
+    ('gnoise', 'gnoise', [3, 0.5, 0.05], 0.15, 0.5, 1),
+    ('pink', 'pink', [3, 0.5, 0.05], 0.15, 0.5, 1),
+)
+
+
+# (name, wave) of the defaults with the functions of ns, this module or wave_gen,
+# the functions ns doesn't have are left out
+def waves(ns=None):
+    ns = ns or sys.modules[__name__]
+    return tuple((name, {'func': getattr(ns, func), 'pars': list(pars), 'amplitude': amplitude,
+                         'offset': offset, 'replicate': replicate})
+                 for name, func, pars, amplitude, offset, replicate in DEFAULTS if hasattr(ns, func))
+
+
+def timeit(fn, repeat):
+    import time
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter()-t0
+        best = dt if best is None or dt < best else best
+    return best
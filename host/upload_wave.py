@@ -0,0 +1,187 @@
+# Upload an arbitrary waveform to the AWG over its USB serial port
+#
+# run on a PC while the Pico runs the ui (main.py):
+#   python host/upload_wave.py /dev/ttyACM0 wave.bin --frequency 1000
+#   python host/upload_wave.py COM5 wave.csv --frequency 50 --periods 2
+# .bin/.raw files hold raw 8-bit DAC codes, any other file numbers separated by
+# commas or white space: DAC codes 0..255, or values 0.0..1.0 when one of them has a
+# decimal point (scaled like wave_gen does, 1.0 is the top of the DAC).
+# The samples are sent in chunks with CRC-32 (protocol in wave_upload), the Pico
+# receives them into its idle sample buffer and plays them at --frequency, periods
+# being how many periods the file holds. A file that isn't a multiple of 4 samples
+# long is repeated until it is, with the periods multiplied.
+# Uses pyserial when it is installed, else the port is opened as a POSIX terminal
+# (Linux, macOS), which is also how host/check_upload.py drives a pseudo-terminal.
+
+import argparse
+import os
+import select
+import struct
+import sys
+import time
+import zlib
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+MAGIC = b'AWGU'
+ACK = b'\x06'
+NAK = b'\x15'
+CAN = b'\x18'
+CHUNK = 4096        # samples per chunk, one acknowledge each
+READY_S = 2.0       # the ui polls for uploads between its other tasks
+REPLY_S = 1.0
+RETRIES = 3         # resends of a chunk before giving up
+DACBITS = 8
+
+
+class UploadError(Exception):
+    pass
+
+
+class PosixPort:
+
+    def __init__(self, path):
+        import tty
+        self.fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.fd)
+
+    def write(self, data):
+        mv = memoryview(data)
+        while mv:
+            mv = mv[os.write(self.fd, mv):]
+
+    def read(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return b''
+        return os.read(self.fd, 4096)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class SerialPort:
+
+    def __init__(self, path):
+        self.port = serial.Serial(path, 115200)     # USB-CDC ignores the baud rate
+
+    def write(self, data):
+        self.port.write(data)
+
+    def read(self, timeout):
+        self.port.timeout = timeout
+        return self.port.read(max(1, self.port.in_waiting))
+
+    def close(self):
+        self.port.close()
+
+
+def open_port(path):
+    return SerialPort(path) if serial else PosixPort(path)
+
+
+# replies of the Pico on a port, the text it prints in between is kept in text
+class Link:
+
+    def __init__(self, port):
+        self.port = port
+        self.pending = b''
+        self.text = bytearray()
+
+    def write(self, data):
+        self.port.write(data)
+
+    def reply(self, timeout=REPLY_S):
+        end = time.monotonic()+timeout
+        while True:
+            for i, b in enumerate(self.pending):
+                if bytes((b,)) in (ACK, NAK, CAN):
+                    self.text += self.pending[:i]
+                    self.pending = self.pending[i+1:]
+                    return bytes((b,))
+            self.text += self.pending
+            self.pending = b''
+            left = end-time.monotonic()
+            if left <= 0:
+                return None
+            self.pending = self.port.read(left)
+
+
+def load(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if os.path.splitext(path)[1].lower() in ('.bin', '.raw'):
+        return data
+    words = data.decode().replace(',', ' ').split()
+    top = (1 << DACBITS)-1
+    if any('.' in s for s in words):
+        return bytes(max(0, min(top, int((1 << DACBITS)*float(s)))) for s in words)
+    return bytes(max(0, min(top, int(s))) for s in words)
+
+
+# repeat samples until they are a multiple of 4 long, returns them and their periods
+def whole_words(samples, periods):
+    k = 1
+    while len(samples)*k % 4:
+        k += 1
+    return samples*k, periods*k
+
+
+def header(samples, frequency, periods, chunk):
+    head = struct.pack('<IfHHI', len(samples), frequency, periods, chunk, zlib.crc32(samples))
+    return head+struct.pack('<I', zlib.crc32(head))
+
+
+# send samples and have the Pico play them, returns seconds, bytes/s and resends
+def upload(link, samples, frequency, periods=1, chunk=CHUNK):
+    if len(samples) % 4:
+        raise UploadError('{} samples are not a multiple of 4'.format(len(samples)))
+    t0 = time.monotonic()
+    link.write(MAGIC)
+    if link.reply(READY_S) != ACK:
+        raise UploadError('no answer from the AWG, is the ui running?')
+    link.write(header(samples, frequency, periods, chunk))
+    if link.reply() != ACK:
+        raise UploadError('the AWG refused {} samples'.format(len(samples)))
+    resends = 0
+    mv = memoryview(samples)
+    for pos in range(0, len(samples), chunk):
+        part = mv[pos:pos+chunk]
+        for attempt in range(RETRIES+1):
+            link.write(bytes(part)+struct.pack('<I', zlib.crc32(part)))
+            r = link.reply()
+            if r != NAK:
+                break
+            resends += 1
+        if r != ACK:
+            raise UploadError('chunk at sample {} not received'.format(pos))
+    if link.reply(READY_S) != ACK:
+        raise UploadError('the AWG could not set up the wave')
+    dt = time.monotonic()-t0
+    return {'seconds': dt, 'rate': len(samples)/dt, 'resends': resends}
+
+
+def main():
+    ap = argparse.ArgumentParser(description='upload an arbitrary waveform to the AWG')
+    ap.add_argument('port', help='serial port of the Pico, e.g. /dev/ttyACM0 or COM5')
+    ap.add_argument('file', help='.bin/.raw DAC codes, or numbers separated by commas or spaces')
+    ap.add_argument('--frequency', type=float, default=1000, help='Hz of one period')
+    ap.add_argument('--periods', type=int, default=1, help='periods the file holds')
+    ap.add_argument('--chunk', type=int, default=CHUNK, help='samples per chunk')
+    args = ap.parse_args()
+    samples, periods = whole_words(load(args.file), args.periods)
+    link = Link(open_port(args.port))
+    try:
+        r = upload(link, samples, args.frequency, periods, args.chunk)
+    except UploadError as e:
+        sys.exit('upload failed: {}'.format(e))
+    finally:
+        link.port.close()
+    print('{} samples in {:.1f} ms, {:.0f} kB/s, {} chunks resent'.format(
+        len(samples), 1000*r['seconds'], r['rate']/1000, r['resends']))
+
+
+if __name__ == '__main__':
+    main()
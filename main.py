@@ -1,2 +1,4 @@
 # main.py starts AWG by:
-import ui
\ No newline at end of file
+# playing the last wave before the gui loads, then ui (see wave_boot)
+import wave_boot
+wave_boot.boot()
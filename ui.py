@@ -17,8 +17,11 @@ version_date = '18-Feb-2022'
 # modified for 10bit R2R ladder network DAC
 
 # hardware_setup must be imported before other modules because of RAM use.
-# To reduce memory fragmentation, next buffers for AWG are created
-# then AWG functions are imported, last all gui functions are imported
+# To reduce memory fragmentation, next buffers for AWG are created (wave_arena)
+# then AWG functions are imported, last all gui functions are imported.
+# Started by main.py through wave_boot, the arena and the last wave are there already:
+# the wave plays before the gui loads, the screen takes it over. Modules only some
+# buttons need (wave_seq, wave_expr, wave_store) are imported on first use.
 
 #v3-Nov: modified for 8-bit DAC
 #v10-Nov: implemented micro-gui "adjusters" for parameters
@@ -28,15 +31,30 @@ version_date = '18-Feb-2022'
 
 import hardware_setup  # Create a display instance
 import gc
+import wave_boot
 
 gc.collect() # precaution to free up unused RAM
 
 #make buffers for the waveform.
-#large buffers give better results but are slower to fill
+#large buffers give better results but are slower to fill. They come from an arena
+#sized from the free RAM, wave_gen picks the samples per set up (see wave_arena)
 wavbuf={}
 
-maxsamp= 512   #must be a multiple of 4. Will be changed dynamically in wave_gen based on frequency
-wavbuf[0]=bytearray(maxsamp)
+import wave_arena
+#second buffer for double buffering: the new wave is calculated while the old one keeps playing
+from wave_config import double_buffer, live_controls, boot_profile
+arena = wave_arena.arena or wave_arena.allocate(2 if double_buffer else 1)
+wavbuf[0]=arena.bufs[0]
+if double_buffer:
+    wavbuf[1]=arena.bufs[1]
+live = double_buffer and live_controls
+
+#debug line: the headline shows the phase timing of the last set up instead (see wave_trace)
+debug_setup = False
+
+#ms a wave has to play unchanged before it is saved for the next boot (wave_boot.remember),
+#a flash write blocks the gui for a while
+remember_ms = 10000
 
 #AWG_status flag
 # status:   Meaning:
@@ -44,23 +62,44 @@ wavbuf[0]=bytearray(maxsamp)
 # stopped     generator output stopped, new set up trigger is allowed, initialization status
 # calc wave   generetor set up is trigger, wave form is calculated, no further trigger is allowed
 # running     calculation finished, generator output active, new set up trigger is allowed
+# sequence    stored sequence playing (wave_seq), set up or stop ends it
 # -- init --  intitialization, generator not yet started using start button
 
 #import AWG functions
 from wave_gen import *
-#define wave with defaults
-wave = {'func' : sine,
-        'frequency' : 2000,
-        'amplitude' : 0.48,
-        'offset' : 0.5,
-        'phase' : 0,
-        'replicate' : 1,
-        'pars' : [0.2, 0.4, 0.2],
-        'frequency_value' : 2000,
-        'freq_range' : 1,
-        'AWG_status' : '- init -',
-        'nsamp' : 0,
-        'F_out' : 0,}
+from wave_async import setupwave_async
+from wave_upload import Uploader
+from wave_config import expressions
+#the second core calculates the waves, see wave_worker
+use_core1 = True
+if use_core1:
+    from wave_worker import Worker
+    set_worker(Worker())
+
+#define wave with defaults, a slotted Wave that the callbacks use like a dict (see wave_spec)
+from wave_spec import Wave
+wave = Wave(func = sine,
+            frequency = 2000,
+            amplitude = 0.48,
+            offset = 0.5,
+            phase = 0,
+            replicate = 1,
+            pars = [0.2, 0.4, 0.2],
+            frequency_value = 2000,
+            freq_range = 1,
+            AWG_status = '- init -',
+            nsamp = 0,
+            F_out = 0)
+
+# stored sequence of the 'seq' button: 5 cycles of sine, a gap, then a pulse train.
+# It plays from the buffer arena in a loop (see wave_seq)
+def stored_sequence():
+    from wave_seq import Sequence
+    seq = Sequence(1000000)     # samples/s
+    seq.wave(Wave(func = sine, pars = [0.2, 0.4, 0.2], amplitude = 0.48, offset = 0.5, frequency = 10000), cycles = 5)
+    seq.gap(0.0005, level = 0.5)
+    seq.wave(Wave(func = pulse, pars = [0.05, 0.5, 0.05], amplitude = 0.89, offset = 0, frequency = 20000), cycles = 10)
+    return seq
 
 # defaults for the different functions for initialization, when function is selected
 # values only if max_value needs to be defined to ensure proper wave form
@@ -70,6 +109,8 @@ max_ampl = {'sine' : 0.48,
             'sinc' : 0.5,
             'expo' : 0.5,
             'noise' : 1,
+            'gnoise' : 0.15,
+            'pink' : 0.15,
             }
 
 
@@ -77,10 +118,11 @@ max_ampl = {'sine' : 0.48,
 gc.collect() # precaution to free up unused RAM
 
 # import gui functions
+hardware_setup.gui_setup()
 from gui.core.ugui import Screen, ssd
 
 from gui.widgets.label import Label
-from gui.widgets.buttons import ButtonList
+from gui.widgets.buttons import Button, ButtonList
 from gui.widgets.dropdown import Dropdown
 from gui.widgets.sliders import HorizSlider
 from gui.widgets.scale_log import ScaleLog
@@ -110,6 +152,90 @@ gc.collect()    # precaution to free up unused RAM
 head_line = 'Arbirtaty 8-bit wave form generator v'
 version = version_date
 
+# output frequency as the labels show it
+def fmt_freq(f_out):
+    if f_out > 999999:
+        return '{:7.3f}'.format(f_out/1000000) + ' MHz'
+    elif f_out > 999:
+        return '{:7.3f}'.format(f_out/1000) + ' kHz'
+    return '{:7.3f}'.format(f_out) + ' Hz'
+
+
+# library screen: waves stored on flash (wave_store) play again without being calculated
+# (wave_boot loads the last wave with wave_store, the widgets load on first use)
+import wave_store
+class StoreScreen(Screen):
+
+    EMPTY = '- empty -'
+
+    def __init__(self, func_name, on_load):
+        from gui.widgets.buttons import CloseButton
+        from gui.widgets.listbox import Listbox
+        super().__init__()
+        self.func_name = func_name  # function of the playing wave, names a save
+        self.on_load = on_load      # updates the base screen after a load
+        wri = CWriter(ssd, font, GREEN, BLACK, verbose=False)
+
+        Label(wri, 2, 2, 'Wave library', fgcolor = BLUE)
+        self.lb = Listbox(wri, 25, 2, elements = wave_store.entries() or [StoreScreen.EMPTY],
+                          dlines = 8, width = 185, bdcolor = GREEN, callback = self.select_cb)
+        self.func_lbl = Label(wri, 25, 195, 120, fgcolor = LIGHTGREY)
+        self.nsamp_lbl = Label(wri, 45, 195, 120, fgcolor = LIGHTGREY)
+        self.fout_lbl = Label(wri, 65, 195, 120, fgcolor = ORANGE)
+        self.msg_lbl = Label(wri, 185, 2, 316, fgcolor = YELLOW)
+
+        row = 210
+        Button(wri, row, 2, width = 60, text = 'load', textcolor = WHITE, bgcolor = LIGHTGREEN,
+               bdcolor = False, litcolor = GREEN, callback = self.load_cb)
+        Button(wri, row, 70, width = 60, text = 'save', textcolor = WHITE, bgcolor = DARKBLUE,
+               bdcolor = False, litcolor = BLUE, callback = self.save_cb)
+        Button(wri, row, 138, width = 60, text = 'delete', textcolor = WHITE, bgcolor = LIGHTRED,
+               bdcolor = False, litcolor = RED, callback = self.delete_cb)
+        CloseButton(wri)
+        self.select_cb(self.lb)
+
+    def selected(self):
+        name = self.lb.textvalue()
+        return None if name == StoreScreen.EMPTY else name
+
+    # the same screen again with the changed list
+    def reopen(self):
+        Screen.change(StoreScreen, mode = Screen.REPLACE, args = (self.func_name, self.on_load))
+
+    def select_cb(self, lb):
+        name = self.selected()
+        if name:
+            e = wave_store.info(name)
+            self.func_lbl.value(e['func'])
+            self.nsamp_lbl.value('{} samples'.format(e['nsamp']))
+            self.fout_lbl.value(fmt_freq(e['F_out']))
+
+    def load_cb(self, button):
+        name = self.selected()
+        if name:
+            try:
+                wave_store.load(name, wavbuf, wave)
+            except (OSError, ValueError) as e:
+                self.msg_lbl.value(str(e))
+                return
+            self.on_load()
+            Screen.back()
+
+    def save_cb(self, button):
+        func = self.func_name()
+        try:
+            wave_store.save('{} {}'.format(func, fmt_freq(wave['F_out']).strip()), wave, func)
+        except (OSError, ValueError) as e:
+            self.msg_lbl.value(str(e))
+            return
+        self.reopen()
+
+    def delete_cb(self, button):
+        name = self.selected()
+        if name:
+            wave_store.delete(name)
+            self.reopen()
+
 
 class BaseScreen(Screen):
 
@@ -162,6 +288,107 @@ class BaseScreen(Screen):
 
 
 
+        # producer of streaming noise, refills the block the DMA has just played,
+        # and restarts the DMA of ring mode when its transfer count runs out
+        async def stream_task():
+            while True:
+                stream_poll()
+                ring_poll()
+                if sequence_done():     # a burst has played
+                    stopDMA()
+                    wave['AWG_status'] = 'stopped'
+                    update_status(wave['AWG_status'])
+                await asyncio.sleep_ms(0)
+
+        asyncio.create_task(stream_task())
+
+        # the set up runs as a task: the wave is calculated in chunks while the gui keeps
+        # running and the old wave keeps playing, 'stop generator' cancels it (see wave_async)
+        self.setup_task = None
+
+        def cancel_setup():
+            if self.setup_task:
+                self.setup_task.cancel()
+                self.setup_task = None
+
+        def setup_progress(p):
+            status_lbl.value('calc {:d}%'.format(int(100*p)))
+
+        async def setup():
+            await setupwave_async(wavbuf, wave, setup_progress)
+            self.setup_task = None
+            show_setup()
+
+        # waves uploaded over USB (host/upload_wave.py) are received and set up between
+        # the other tasks, see wave_upload
+        uploader = Uploader()
+
+        async def upload_task():
+            while True:
+                if uploader.poll(wavbuf, wave):
+                    cancel_setup()
+                    take_over()
+                await asyncio.sleep_ms(20)
+
+        asyncio.create_task(upload_task())
+
+        # saves the wave for the next boot (wave_boot) once it has played remember_ms
+        # unchanged, instead of a flash write after every set up
+        self.changed = None     # ticks_ms of the last change not saved yet
+
+        async def remember_task():
+            while True:
+                await asyncio.sleep_ms(1000)
+                t = self.changed
+                if t is not None and utime.ticks_diff(utime.ticks_ms(), t) >= remember_ms:
+                    self.changed = None
+                    if wave['AWG_status'] == 'running':
+                        try:
+                            wave_boot.remember(wave)
+                        except OSError as e:
+                            print('0: last wave not saved:', e)
+
+        asyncio.create_task(remember_task())
+
+        # a wave the controls didn't set up (wave_boot, the library, an upload) is not what
+        # they show: they stay inactive until a function is chosen (setup, stop or, with
+        # live controls, the menu), that starts from its defaults
+        self.restored = False
+
+        def take_over():
+            wave['AWG_status'] = 'running'
+            grey_out_all()
+            if live:
+                func_menu.greyed_out(val=0)
+            self.restored = True
+            show_setup()
+
+        def release_restored():
+            if self.restored:
+                self.restored = False
+                wave['func'] = None     # not the function chosen, so its defaults are set
+                freq_menu.greyed_out(val=0)
+                frange_menu.greyed_out(val=0)
+                Amplitude.greyed_out(val=0)
+                Offset.greyed_out(val=0)
+
+        def show_setup():
+            update_status(wave['AWG_status'])
+            nsamp_lbl.value(str(wave['nsamp']))
+            if debug_setup:
+                debug_lbl.value(trace_summary())
+            
+            # due to digital wave synthesis, AWG frequency can deviate from requested frequency
+            # actual frequency is calculated by AWG and displayed to the user
+            fout_lbl.value(fmt_freq(wave['F_out']))
+            # the next boot starts with this wave, once it has played for a while (remember_task)
+            self.changed = utime.ticks_ms()
+
+            # refresh screen and stop, keep refreshing if controls can still be changed
+            if not live:
+                asyncio.create_task(refresh_and_stop())
+                refresh_and_stop()
+
         # definition of call backs
         def startstop_cb(button, val):
             gc.collect()
@@ -169,8 +396,12 @@ class BaseScreen(Screen):
 
 
             if val == 'setup':
+                if self.restored:   # set up what the controls show
+                    function_cb(func_menu)
 
-                grey_out_all()
+                # live controls stay active, a new setup switches the running output over
+                if not live:
+                    grey_out_all()
 
                 wave['AWG_status']='calc wave'
                 update_status(wave['AWG_status'])
@@ -178,28 +409,12 @@ class BaseScreen(Screen):
 
                 #input('press ENTER for setup wave')
 
-                setupwave(wavbuf[0],wave)
-
-                update_status(wave['AWG_status'])
-                nsamp_lbl.value(str(wave['nsamp']))
-                
-                # due to digital wave synthesis, AWG frequency can deviate from requested frequency
-                # actual frequency is calculated by AWG and displayed to the user
-                f_out = wave['F_out']
-                if f_out > 999999:
-                    fout_lbl.value('{:7.3f}'.format(f_out/1000000) + ' MHz')
-                elif f_out > 999:
-                    fout_lbl.value('{:7.3f}'.format(f_out/1000) + ' kHz')
-                else:
-                    fout_lbl.value('{:7.3f}'.format(f_out) + ' Hz')
-
-
-                # refresh screen and stop
-                asyncio.create_task(refresh_and_stop())
-                refresh_and_stop()
+                cancel_setup()  # a set up still calculating is replaced by this one
+                self.setup_task = asyncio.create_task(setup())
 
 
             elif val == 'stop':
+                cancel_setup()
                 wave['AWG_status']='stopped'
                 update_status(wave['AWG_status'])
                 wave['nsamp'] = 0
@@ -213,9 +428,26 @@ class BaseScreen(Screen):
             else:
                 print('wrong button received')
 
+        # play the stored sequence, the setup button returns to the single wave
+        def sequence_cb(button):
+            cancel_setup()
+            seq = stored_sequence()
+            seq.play(wave_arena.arena.mem)    # not arena: the star import of wave_gen rebinds it
+            wave['AWG_status'] = 'sequence'
+            update_status(wave['AWG_status'])
+            nsamp_lbl.value(str(seq.samples))
+            fout_lbl.value('{:7.3f}'.format(1/seq.duration()) + ' Hz')
+
 
 
+        # the library screen saves the playing wave under its function and frequency
+        def library_cb(button):
+            cancel_setup()
+            func = lambda: 'stored' if wave['func'] is arbitrary else func_menu.textvalue()
+            Screen.change(StoreScreen, args = (func, take_over))
+
         def function_cb(dd):
+            release_restored()
             fun = dd.textvalue()
             # enable/disable parameter controls as required by function
             if fun == 'sine':
@@ -278,6 +510,20 @@ class BaseScreen(Screen):
                     Offset.value(0)
                     noise_adj.value(0.45)
 
+            elif fun == 'gnoise' or fun == 'pink':   # gaussian and pink noise have no parameters
+                width_adj.greyed_out(val=1)
+                rise_adj.greyed_out(val=1)
+                up_adj.greyed_out(val=1)
+                fall_adj.greyed_out(val=1)
+                noise_adj.greyed_out(val=1)
+                expo_adj.greyed_out(val=1)
+                wave['replicate'] = 1
+                f = gnoise if fun == 'gnoise' else pink
+                if wave['func'] != f: # initialize wave for noise
+                    wave['func'] = f
+                    Amplitude.value(max_ampl[fun])
+                    Offset.value(0.5)
+
             elif fun == 'sinc':
                 width_adj.greyed_out(val=0)
                 rise_adj.greyed_out(val=1)
@@ -307,18 +553,52 @@ class BaseScreen(Screen):
                     width_adj.value(0.5)
                     expo_adj.value(0.49)
 
+            elif fun in expressions:   # user waveform of wave_config, compiled once (wave_expr)
+                width_adj.greyed_out(val=1)
+                rise_adj.greyed_out(val=0)
+                up_adj.greyed_out(val=0)
+                fall_adj.greyed_out(val=0)
+                noise_adj.greyed_out(val=1)
+                expo_adj.greyed_out(val=1)
+                wave['replicate'] = 1
+                text, ampl, offs = expressions[fun]
+                from wave_expr import compile_expr
+                try:
+                    f = compile_expr(text)
+                except ValueError as e:
+                    print(fun, e)
+                    return
+                if wave['func'] != f: # initialize wave for the expression
+                    wave['func'] = f
+                    Amplitude.value(ampl)
+                    Offset.value(offs)
+                    rise_adj.value(0.5)
+                    up_adj.value(0.5)
+                    fall_adj.value(0.5)
+
             else:
                 print('no valid function selected')
 
 
 
+        # with live controls a running generator follows amplitude and offset at once,
+        # wave_gen only rescales the stored wave shape for it
+        def apply_live():
+            if live and wave['AWG_status'] == 'running':
+                setupwave_db(wavbuf, wave)
+                self.changed = utime.ticks_ms()
+                if debug_setup:
+                    debug_lbl.value(trace_summary())
+
         def amplitude_cb(s):
             v = s.value()
             wave['amplitude'] = v
+            apply_live()
 
         def offset_cb(s):
             v = s.value()
             wave['offset'] = v
+            apply_live()
 
         def freqlog_cb(f):
             v = f.value()
@@ -390,6 +670,8 @@ class BaseScreen(Screen):
                 status_lbl.value(text = s, bdcolor = None, bgcolor = BLACK, fgcolor = ORANGE)
             elif s == 'running':
                 status_lbl.value(text = s, bdcolor = None, bgcolor = LIGHTGREEN, fgcolor = WHITE)
+            elif s == 'sequence':
+                status_lbl.value(text = s, bdcolor = None, bgcolor = DARKGREEN, fgcolor = WHITE)
             elif s == '- init -':
                 status_lbl.value(text = s, bdcolor = None, bgcolor = DARKBLUE, fgcolor = ORANGE)
             else:
@@ -418,10 +700,15 @@ class BaseScreen(Screen):
         super().__init__()
         wri = CWriter(ssd, font, GREEN, BLACK, verbose=False)
 
-        # headline and version
+        # headline and version, or the debug line
         col = 2
         row = 2
-        Label(wri, row, col, head_line + version, fgcolor = BLUE, bgcolor = LIGHTGREY)
+        if debug_setup:
+            set_trace()
+            debug_lbl = Label(wri, row, col, 316, fgcolor = ORANGE, bgcolor = BLACK)
+            debug_lbl.value('set up trace on')
+        else:
+            Label(wri, row, col, head_line + version, fgcolor = BLUE, bgcolor = LIGHTGREY)
         
 
         # create function labels
@@ -451,7 +738,7 @@ class BaseScreen(Screen):
         col = 80
         row = 22
         func_menu = Dropdown(wri, row, col, callback=function_cb,
-                elements = ('sine', 'pulse', 'gauss', 'sinc', 'expo', 'noise'),
+                elements = ('sine', 'pulse', 'gauss', 'sinc', 'expo', 'noise', 'gnoise', 'pink') + tuple(sorted(expressions)),
                 bdcolor = GREEN, bgcolor = DARKGREEN)
 
         
@@ -529,6 +816,12 @@ class BaseScreen(Screen):
         for t in table_startstop_buttons:
             start_stop.add_button(wri, row, col, textcolor = WHITE, **t)
 
+        # buttons to play the stored sequence and to open the wave library
+        Button(wri, row, 2, width = 34, text = 'seq', textcolor = WHITE, bgcolor = DARKBLUE,
+               bdcolor = False, litcolor = BLUE, callback = sequence_cb)
+        Button(wri, row, 40, width = 34, text = 'lib', textcolor = WHITE, bgcolor = DARKBLUE,
+               bdcolor = False, litcolor = BLUE, callback = library_cb)
+
     
         # Display calculated frequency in bottom right corner
         col = 210
@@ -536,6 +829,16 @@ class BaseScreen(Screen):
         fout_lbl = Label(wri, row+14, col+10, 90,fgcolor = ORANGE)
         fout_lbl.value('0' + 'Hz')
 
+        # take over the wave wave_boot started before the gui loaded
+        w = wave_boot.wave
+        if w is not None:
+            for k in ('func', 'frequency', 'nsamp', 'F_out'):
+                wave[k] = w[k]
+            take_over()
+        wave_boot.mark('screen built')
+        if boot_profile:
+            print(wave_boot.report())
+
 
 try:
     gc.collect() # precaution to free up unused RAM
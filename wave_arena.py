@@ -0,0 +1,58 @@
+# Sample buffer arena for the AWG
+#
+# The sample buffers and the shape copy of wave_gen are allocated once, right
+# after hardware_setup, while the heap is still in one piece. Their size follows
+# the RAM left then (gc.mem_free()) instead of a fixed maxsamp:
+#   import hardware_setup
+#   import wave_arena
+#   arena = wave_arena.allocate(2)      # before wave_gen is imported
+# wave_gen then uses arena.size as its largest sample count and arena.shape for
+# the shape copy; how many samples a set up uses is decided per wave (samplelimit).
+# Without an arena (e.g. on a PC) wave_gen keeps wave_config.maxsamp.
+
+import gc
+from array import array
+from uctypes import addressof
+from wave_config import maxsamp, arena_reserve, arena_max
+
+
+class Arena:
+
+    def __init__(self, size, nbuf=2):
+        self.size = size        # bytes (samples) per buffer, a power of two
+        # one block with room to align every buffer to its size, for the DMA read
+        # ring (wave_gen.startRing); a wave of 2**k samples then wraps in its buffer
+        self.mem = bytearray((nbuf+1)*size)
+        off = -addressof(self.mem) & (size-1)
+        m = memoryview(self.mem)
+        self.bufs = [m[off+i*size:off+(i+1)*size] for i in range(nbuf)]
+        self.shape = array('H', bytearray(2*size))   # 16-bit shape copy of wave_gen
+
+    def nbytes(self):
+        return len(self.mem)+2*self.size
+
+
+arena = None
+
+
+# largest power of two buffer size for nbuf aligned sample buffers plus the shape copy
+# (2 bytes per sample) in the free heap, keeping reserve bytes for what is imported after it
+def capacity(free, nbuf=2, reserve=arena_reserve, limit=arena_max):
+    n = maxsamp
+    while n < limit and (free-reserve)//(nbuf+3) >= 2*n:
+        n *= 2
+    return n
+
+
+def allocate(nbuf=2, reserve=arena_reserve, limit=arena_max):
+    global arena
+    gc.collect()
+    try:
+        free = gc.mem_free()
+    except AttributeError:  # CPython
+        free = reserve+(nbuf+3)*limit
+    arena = Arena(capacity(free, nbuf, reserve, limit), nbuf)
+    gc.collect()
+    return arena
+
+# eof
@@ -0,0 +1,163 @@
+# Non-blocking set up of the AWG for uasyncio
+#
+# setupwave_async does what setupwave_db (or setupwave with one buffer) does, but
+# calculates the samples in chunks and yields to the event loop in between, so the
+# gui keeps reading the encoder and redrawing while a long wave is calculated:
+#   task = asyncio.create_task(setupwave_async(wavbuf, wave, progress))
+#   task.cancel()       # e.g. on 'stop generator'
+# progress(fraction) is called after every chunk. With two buffers the old wave
+# keeps playing until the new one is complete. A cancelled set up leaves the output,
+# the cache and the stored shape as they were.
+# A chunk is what the function calculates in CHUNK_MS, measured on earlier set ups.
+# The repeating unit is calculated sample by sample here, the symmetry shortcuts of
+# wave_kernels.fill_symmetric can't be split into chunks. With a worker on the second
+# core (wave_worker) core 1 calculates the whole unit while the event loop runs.
+
+try:
+    import uasyncio as asyncio
+except ImportError:  # CPython
+    import asyncio
+import gc
+import utime
+import wave_gen as wg
+from wave_kernels import unit_length, tile, rescale, SHAPE_BITS, SHAPE_AMPLITUDE, SHAPE_OFFSET
+
+CHUNK_MS=10       #calculation between two yields to the event loop
+CHUNK=64          #samples of the first chunk of a function, before its rate is known
+RESCALE_CHUNK=512 #samples rescaled between two yields
+
+chunk_rates={}    #func -> samples per ms of the chunked calculation
+
+#calculate the repeating unit of the wave into buf in chunks, returns its length.
+#With a worker on the second core it calculates the unit in one go instead.
+async def fillunit_async(buf,w,nsamp,dup,amplitude,offset,dacbits,progress):
+    wk=wg.worker
+    if wk:
+        await wk.wait()  #a cancelled set up may still be calculating
+        wk.submit(wg.fillunit,(buf,w,nsamp,dup,amplitude,offset,dacbits,False))
+        unit=await wk.wait()
+        if progress:
+            progress(1)
+        return unit
+    func=w['func']
+    kernel=wg.synth_kernels[wg.synthmode].get(func)
+    unit=nsamp if kernel in wg.aperiodic else unit_length(nsamp,dup,w['replicate'])
+    a=0
+    while a<unit:
+        rate=chunk_rates.get(func)
+        b=min(unit,a+(max(16,int(rate*CHUNK_MS)) if rate else CHUNK))
+        t0=utime.ticks_us()
+        if kernel:
+            kernel(buf,a,b,nsamp,dup,w['replicate'],w['pars'],amplitude,offset,dacbits)
+        else:
+            wg.fill_eval(func,buf,a,b,nsamp,dup,w['replicate'],w['pars'],amplitude,offset,dacbits)
+        chunk_rates[func]=(b-a)*1000/max(1,utime.ticks_diff(utime.ticks_us(),t0))
+        a=b
+        if progress:
+            progress(a/unit)
+        await asyncio.sleep(0)
+    return unit
+
+#rescale the stored shape into buf in chunks, see wave_kernels.rescale
+async def rescale_async(buf,n,amplitude,offset,progress):
+    mb=memoryview(buf)
+    ms=memoryview(wg.shape)
+    for a in range(0,n,RESCALE_CHUNK):
+        b=min(n,a+RESCALE_CHUNK)
+        rescale(mb[a:],ms[a:],b-a,amplitude,offset,wg.DACbits)
+        if progress:
+            progress(b/n)
+        await asyncio.sleep(0)
+
+#wave_gen.makewave in chunks. last_shape and the cache only change once the samples
+#are complete, the stored shape counts as gone while it is calculated again
+async def makewave_async(buf,w,nsamp,dup,clkdiv,progress):
+    if wg.worker:  #a cancelled async set up may still be calculating into buf on core 1
+        await wg.worker.wait()
+    if w['func'] is wg.arbitrary:
+        return wg.upload_samples(buf,nsamp)
+    wg.overwrite(buf)
+    skey=wg.shapekey(w,nsamp,dup)
+    if skey==wg.shape_key or skey==wg.last_shape:
+        if skey!=wg.shape_key:  #second set up of a cached wave, keep its normalised copy from now on
+            wg.shape_key=None   #overwritten from here
+            wg.shape_unit=await fillunit_async(wg.shape,w,nsamp,dup,SHAPE_AMPLITUDE,SHAPE_OFFSET,SHAPE_BITS,progress)
+            wg.shape_key=skey
+        await rescale_async(buf,wg.shape_unit,w['amplitude'],w['offset'],progress)
+        tile(buf,wg.shape_unit,nsamp)
+        path='rescale'
+    else:
+        key=wg.cache.key(w,nsamp,dup,clkdiv,wg.synthmode)
+        data=wg.cache.get(key)
+        if data is None:  #the normalised shape, every later amplitude or offset only rescales it
+            wg.shape_key=None
+            wg.shape_unit=await fillunit_async(wg.shape,w,nsamp,dup,SHAPE_AMPLITUDE,SHAPE_OFFSET,SHAPE_BITS,progress)
+            wg.shape_key=skey
+            await rescale_async(buf,wg.shape_unit,w['amplitude'],w['offset'],None)
+            tile(buf,wg.shape_unit,nsamp)
+            wg.cache.put(key,memoryview(buf)[0:nsamp])
+            path='calc'
+        else:
+            memoryview(buf)[0:nsamp]=data
+            path='cache'
+    wg.last_shape=skey
+    return path
+
+#set up wave w in bufs (one or two buffers) without blocking the event loop
+async def setupwave_async(bufs,w,progress=None):
+    single=len(bufs)<2
+    c=w.copy() #the controls may change w between two chunks: calculate one wave, keyed as calculated
+    c['pars']=tuple(w['pars'])
+    nsamp,dup,clkdiv=wg.planwave(c)
+    key=wg.samplekey(c,nsamp,dup)
+    if (wg.stream_noise and w['func'] in wg.streamed or #streaming only fills a block at set up
+        wg.playing is not None and key==wg.playing_key): #same samples, only the frequency changes
+        if single:
+            wg.setupwave(bufs[0],w)
+        else:
+            wg.setupwave_db(bufs,w)
+        return
+
+    if wg.streaming: #the noise blocks are in the buffers
+        wg.stopDMA()
+
+    t=wg.trace
+    if t: t.begin('setupwave_async',w)
+    w['AWG_status']='calc wave'
+    if wg.playing is None or single:
+        buf=bufs[0]
+    else:
+        buf=bufs[1] if wg.playing is bufs[0] else bufs[0]
+    if buf is wg.playing: #one buffer, calculated while it plays
+        wg.playing_key=None
+    if t: t.phase('plan')
+
+    path=await makewave_async(buf,c,nsamp,dup,clkdiv,progress)
+    w['nsamp']=nsamp
+    if t:
+        t.phase('fill')
+        t.note('path',path)
+
+    gc.collect()
+    if t: t.phase('gc')
+
+    if wg.playing is None or buf is wg.playing:
+        d=wg.setclkdiv(clkdiv)
+        wg.startplay(buf,nsamp//4)
+    else:
+        limit=wg.pass_us()
+        wait=wg.newclkdiv(clkdiv)
+        wg.switchplay(buf,nsamp//4,False)
+        t0=utime.ticks_us()
+        while wait and not wg.switched(buf,nsamp//4) and utime.ticks_diff(utime.ticks_us(),t0)<=limit:
+            await asyncio.sleep(0) #the old pass plays out, the other tasks run meanwhile
+        d=wg.setclkdiv(clkdiv)  #new buffer is playing, change its speed
+    wg.playing_key=key
+    wg.playing_dup=dup
+    if t:
+        t.phase('dma')
+        t.end(nsamp,dup,clkdiv)
+    w['F_out']=wg.fclock/d/nsamp*dup
+    w['AWG_status']='running'
+
+# eof
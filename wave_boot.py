@@ -0,0 +1,127 @@
+# Fast boot of the AWG and import profiling
+#
+# main.py starts the last wave before the gui loads:
+#   import wave_boot
+#   wave_boot.boot()
+# boot imports hardware_setup for the clock and the frame buffer (they need the RAM
+# in one piece), allocates the buffer arena, imports wave_gen and loads the last wave
+# from the wave library (wave_store) with readinto, no function is evaluated. Only
+# then ui imports the gui (hardware_setup.gui_setup, ugui, widgets, font) and builds
+# the screen, which takes over the playing wave. ui saves the wave that plays as the
+# library entry '.last' once it has played unchanged for a while (remember).
+# With wave_config.boot_profile every import is timed, builtins.__import__ is wrapped:
+# report() lists the modules with the ms and RAM they took (with what they import,
+# and by themselves) and the marks of the boot, in ms since reset, like 'first output'.
+
+import builtins
+import gc
+import sys
+import utime
+from binascii import crc32
+from wave_config import fast_boot, boot_profile, double_buffer
+
+LAST='.last'   #library entry of the last wave
+wave=None      #the wave boot started, ui takes it over
+marks=[]       #(label, ms since reset)
+imports=[]     #(module, depth, us, own us, bytes) in the order the imports started
+mem_alloc=getattr(gc,'mem_alloc',None) #bytes in use, host/boot_profile.py sets one on a PC
+_import=None
+_child=[]      #us spent in the imports below the ones in progress
+
+def mark(label):
+    marks.append((label,utime.ticks_ms()))
+
+def _timed_import(name,globals=None,locals=None,fromlist=(),level=0):
+    if level or name in sys.modules:
+        return _import(name,globals,locals,fromlist,level)
+    i=len(imports)
+    imports.append(None)
+    m0=mem_alloc() if mem_alloc else 0
+    _child.append(0)
+    t0=utime.ticks_us()
+    try:
+        return _import(name,globals,locals,fromlist,level)
+    finally:
+        dt=utime.ticks_diff(utime.ticks_us(),t0)
+        own=dt-_child.pop()
+        if _child:
+            _child[-1]+=dt
+        imports[i]=(name,len(_child),dt,own,mem_alloc()-m0 if mem_alloc else None)
+
+#time every import from now on
+def profile():
+    global _import
+    if _import is None:
+        _import=builtins.__import__
+        builtins.__import__=_timed_import
+
+def unprofile():
+    global _import
+    if _import is not None:
+        builtins.__import__=_import
+        _import=None
+
+def report():
+    lines=['{:28s} {:>8s} {:>8s} {:>8s}'.format('import','ms','own ms','bytes')]
+    for e in imports:
+        if e is None: #still importing
+            continue
+        name,depth,dt,own,nbytes=e
+        lines.append('{:28s} {:8.1f} {:8.1f} {:>8s}'.format(
+            ' '*depth+name,dt/1000,own/1000,'-' if nbytes is None else str(nbytes)))
+    for label,t in marks:
+        lines.append('{:28s} {:8d} ms after reset'.format(label,t))
+    return '\n'.join(lines)
+
+#play the last wave from the library in the buffers of the arena. The arena comes
+#first: wave_gen takes its buffer size from it when it is imported (wave_store imports it)
+def resume():
+    global wave
+    import wave_arena
+    arena=wave_arena.arena or wave_arena.allocate(2 if double_buffer else 1)
+    mark('arena')
+    import wave_store
+    from wave_spec import Wave
+    if LAST not in wave_store.read_index():
+        mark('no last wave')
+        return None
+    w=Wave()
+    try:
+        wave_store.load(LAST,arena.bufs,w)
+    except (OSError,ValueError) as e:
+        print('0: last wave not restored:',e)
+        return None
+    wave=w
+    mark('first output')
+    return w
+
+def boot():
+    global wave
+    if boot_profile:
+        profile()
+    mark('boot')
+    import hardware_setup
+    mark('hardware_setup')
+    if fast_boot:
+        try:
+            resume()
+        except Exception as e: #a damaged library (index.json) must not keep the gui from starting
+            print('0: last wave not restored:',e)
+            wave=None
+            mark('no last wave')
+    import ui
+
+#save the wave that plays as the one the next boot starts, unless it is saved already.
+#streamed noise and sequences are not looped buffers, they are not kept
+def remember(w):
+    import wave_gen as wg
+    if not fast_boot or wg.playing is None or wg.streaming or wg.sequencing:
+        return
+    import wave_store
+    mv=memoryview(wg.playing)[0:4*wg.playing_nword]
+    e=wave_store.read_index().get(LAST)
+    if e and e['crc']==crc32(mv) and e['F_out']==w['F_out']:
+        return
+    wave_store.save(LAST,w,'last')
+
+# eof
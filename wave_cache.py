@@ -0,0 +1,76 @@
+# LRU cache of calculated waveform buffers for the AWG
+#
+# Operators flip between the same few set ups, each flip used to recalculate
+# the whole buffer. The cache keeps copies of recently used sample buffers,
+# keyed by everything that defines the samples, so a repeated set up only
+# copies the samples back into the DMA buffer.
+# The RAM held is limited by budget, and an entry is only added while at
+# least reserve bytes stay free on the heap (gc.mem_free()).
+# hits and misses can be read from the REPL to size the budget:
+#   >>> wave_gen.cache.stats()
+
+import gc
+from wave_spec import snapshot
+
+
+class WaveCache:
+
+    def __init__(self, budget=4096, reserve=16384):
+        self.budget = budget      # max bytes of samples held
+        self.reserve = reserve    # min free heap left after adding an entry
+        self.entries = {}         # key -> bytes
+        self.order = []           # keys, least recently used first
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    # everything that defines the samples of a buffer, see wave_spec.snapshot
+    @staticmethod
+    def key(w, nsamp, dup, clkdiv, mode=None):
+        return (snapshot(w), nsamp, dup, clkdiv, mode)
+
+    def get(self, key):
+        data = self.entries.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.order.remove(key)
+        self.order.append(key)
+        return data
+
+    def put(self, key, samples):
+        n = len(samples)
+        if n > self.budget:
+            return
+        if key in self.entries:
+            self._drop(key)
+        while self.order and (self.used + n > self.budget or self._free() - n < self.reserve):
+            self._drop(self.order[0])
+        if self._free() - n < self.reserve:
+            return
+        self.entries[key] = bytes(samples)
+        self.order.append(key)
+        self.used += n
+
+    def _drop(self, key):
+        self.used -= len(self.entries.pop(key))
+        self.order.remove(key)
+
+    def _free(self):
+        try:
+            return gc.mem_free()
+        except AttributeError:  # CPython
+            return self.reserve + self.budget
+
+    def clear(self):
+        self.entries = {}
+        self.order = []
+        self.used = 0
+        gc.collect()
+
+    def stats(self):
+        return {'hits' : self.hits, 'misses' : self.misses, 'entries' : len(self.order),
+                'bytes' : self.used, 'budget' : self.budget}
+
+# eof
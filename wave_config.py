@@ -0,0 +1,47 @@
+# Settings shared by the AWG modules
+#
+# wave_gen reads its settings from here instead of from ui, so the synthesis
+# code loads without the display stack (see host/emu for running it on a PC).
+
+maxsamp=512   #must be a power of two. Buffer size without an arena, smallest arena buffer
+
+#second sample buffer: a new wave is calculated while the old one keeps playing
+double_buffer=True
+#controls stay active while the wave plays: setup switches over, amplitude and offset
+#follow at once. The display then keeps refreshing, which adds noise to the output
+live_controls=False
+
+#first of the 8 pins of channel B (wave_dual), None: no channel B. Channel A plays on
+#pins 0-7, the board has no 8 free pins left: the buttons (11-15) or the display have
+#to move to other pins first, and busy_pins has to follow them
+pins_b=None
+busy_pins=(11,12,13,14,15,  #buttons of hardware_setup, wired to Gnd
+           16,17,18,19,20,21, #SPI and control lines of the display
+           23,24,25,29)     #SMPS mode (ui), VBUS sense, LED and VSYS of the Pico
+
+#buffer arena (wave_arena), allocated by ui right after hardware_setup
+arena_reserve=65536   #bytes of heap left for wave_gen, the gui and running
+arena_max=8192        #largest buffer, bytes (samples), a power of two
+
+#samples per set up (wave_gen.samplelimit): more samples give a finer time resolution,
+#fewer are faster to calculate
+fill_budget_ms=50     #calculation time a set up may take at the fill rate seen before
+max_spp=2048          #samples per period beyond which an 8-bit DAC shows no difference
+
+#directory of the on-flash wave library (wave_store)
+store_dir='wavelib'
+
+#boot (wave_boot): play the last wave before the gui loads, and time every import
+fast_boot=True
+boot_profile=False
+
+#user waveforms of the function menu: name -> (expression, amplitude, offset), see wave_expr.
+#p0, p1, p2 are set with the rise, up and fall adjusters (0.0-1.0)
+expressions={
+    'tri' : ('x/p1 if x<p1 else (1-x)/(1-p1)', 0.98, 0),                  #p1: top position
+    'saw' : ('x', 0.98, 0),
+    'am' : ('sin(2*pi*x*8)*(1-p0+p0*sin(2*pi*x))', 0.24, 0.5),           #p0: modulation depth
+    'burst' : ('sin(2*pi*x*10) if x<p1 else 0', 0.48, 0.5),              #p1: burst length
+}
+
+# eof
@@ -0,0 +1,96 @@
+# Two phase locked output channels for the AWG
+#
+# Channel A plays on pins 0-7 as always, channel B on the 8 pins from
+# wave_config.pins_b on, from state machine 1 and DMA CH5/CH6 (wave_gen.startDual).
+# Channel B is opt-in: pins_b is None on the stock board, where no 8 pins are free,
+# and pins that are in use (wave_config.busy_pins) are refused, the state machine
+# would drive them.
+# Both buffers hold the same number of samples, play at the same divider and start
+# on the same clock cycle, so the channels stay locked for as long as they play:
+#   wa = Wave(func=wg.sine, frequency=1000)
+#   wb = Wave(func=wg.sine, phase=0.25)
+#   setupdual(bufs, wa, wb)                 # quadrature, B a quarter period ahead
+#   setupdual(bufs, wa, wb, ratio=(3, 2))   # B at 3/2 of the frequency of A
+# Each channel has its own wave: function, parameters, amplitude and offset. A's
+# frequency is planned like a single channel, B runs at ratio (num, den, or a whole
+# number) of it. B's phase, a fraction of its period (0.0-1.0), is where B is in its
+# period when A starts one. The plan is made once for both: the buffers hold den
+# periods of A and num periods of B. A channel B equal to A but for its phase is
+# copied out of A's buffer rotated, not calculated again. The phase is set to a
+# sample, setupdual returns the phase B plays with.
+# bufs are two sample buffers (the arena), A plays the first, B the second.
+# The output stops while both are calculated, a single channel set up of wave_gen
+# (setupwave, setupwave_db) or stopDMA ends the dual mode.
+
+import wave_gen as wg
+import wave_plan
+from wave_spec import snapshot
+from wave_config import pins_b, busy_pins
+
+PINS = 30   # GPIOs of the RP2040
+
+
+# ratio as (num, den) in lowest terms
+def fraction(ratio):
+    num, den = (ratio, 1) if isinstance(ratio, int) else ratio
+    if num <= 0 or den <= 0:
+        raise ValueError('frequency ratio must be positive')
+    a, b = num, den
+    while b:
+        a, b = b, a % b
+    return num//a, den//a
+
+
+# first pin of channel B, if its 8 pins are free
+def pins():
+    if pins_b is None:
+        raise ValueError('no channel B, set pins_b in wave_config')
+    used = [p for p in range(pins_b, pins_b+8) if p < 8 or p >= PINS or p in busy_pins]
+    if used:
+        raise ValueError('channel B pins {}-{} take pins in use: {}'.format(pins_b, pins_b+7, used))
+    return pins_b
+
+
+# rotate the first nsamp samples of buf k samples to the left
+def rotate(buf, nsamp, k):
+    if k:
+        mv = memoryview(buf)
+        head = bytes(mv[0:k])
+        mv[0:nsamp-k] = mv[k:nsamp]
+        mv[nsamp-k:nsamp] = head
+
+
+def setupdual(bufs, wa, wb, ratio=1):
+    first = pins()
+    num, den = fraction(ratio)
+    for w in (wa, wb):
+        if w['func'] is wg.arbitrary:
+            raise ValueError('uploaded samples play on channel A alone')
+    wg.stopDMA()
+    wg.free_buffers()
+    bufa, bufb = bufs[0], bufs[1]
+    wa['AWG_status'] = wb['AWG_status'] = 'calc wave'
+    limit = min(wg.samplelimit(wa), wg.samplelimit(wb), len(bufa), len(bufb))
+    nsamp, dup, clkdiv = wave_plan.plan(wa['frequency']/den, wg.fclock, limit, wg.fractional_clkdiv, False)
+    wg.overwrite(bufa)
+    wg.overwrite(bufb)
+    wg.fillwave(bufa, wa, nsamp, dup*den)
+    periods = dup*num     # of B in the buffer
+    k = int(wb['phase']*nsamp/periods+0.5) % nsamp
+    if num == den and snapshot(wb) == snapshot(wa):
+        mv = memoryview(bufb)
+        mv[0:nsamp-k] = memoryview(bufa)[k:nsamp]
+        mv[nsamp-k:nsamp] = memoryview(bufa)[0:k]
+    else:
+        wg.fillwave(bufb, wb, nsamp, periods)
+        rotate(bufb, nsamp, k)
+    clkdiv = wg.startDual(bufa, bufb, nsamp >> 2, clkdiv, first)
+    f = wg.fclock/clkdiv/nsamp*dup
+    wa['F_out'] = f*den
+    wb['F_out'] = f*num
+    for w in (wa, wb):
+        w['nsamp'] = nsamp
+        w['AWG_status'] = 'running'
+    return k*periods/nsamp % 1.0
+
+# eof
@@ -0,0 +1,285 @@
+# User waveforms written as expressions, compiled for the AWG
+#
+# An expression of x (position in the period, 0.0-1.0) and the parameters p0, p1, p2
+# (or pars[0]..pars[2]) is parsed once and compiled into a wave function f(x,pars),
+# used like sine or pulse of wave_gen, and a whole-buffer kernel for it that
+# wave_gen.kernels registers, so setupwave fills the buffer without a call per sample:
+#   tri = compile_expr('2*x if x<0.5 else 2-2*x')
+#   w['func'] = tri
+# Parts that don't depend on x, like 1/p2 or p0+p1, are calculated once per fill.
+# The language, a subset of Python expressions:
+#   numbers, x, p0 p1 p2, pars[i], pi, e
+#   + - * / % ** (or ^), unary -, comparisons < <= > >= == != (chained), and or not
+#   a if condition else b        piecewise definitions, chained for more pieces
+#   sin cos tan exp log sqrt abs floor min max
+# Compiled functions are kept by their text: compiling it again returns the same
+# function, so wave_cache and the stored shape of wave_gen still know the wave.
+# ui lists the expressions of wave_config.expressions in its function menu.
+
+from math import sin, cos, tan, exp, log, sqrt, floor, pi, e
+import wave_gen as wg
+
+FUNCS = {'sin': sin, 'cos': cos, 'tan': tan, 'exp': exp, 'log': log, 'sqrt': sqrt,
+         'abs': abs, 'floor': floor, 'min': min, 'max': max}
+CONSTS = {'pi': pi, 'e': e}
+NPARS = 3
+OPS2 = ('**', '<=', '>=', '==', '!=')
+OPS1 = '+-*/%^()<>[],'
+COMPARE = ('<', '<=', '>', '>=', '==', '!=')
+
+compiled = {}   # text -> wave function
+
+
+# list of (token, position), the last one is ('', len(text))
+def tokens(text):
+    toks = []
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c in ' \t\r\n':
+            i += 1
+        elif c.isdigit() or c == '.':
+            j = i
+            while j < n and (text[j].isdigit() or text[j] == '.'):
+                j += 1
+            if j < n and text[j] in 'eE' and j+1 < n and (text[j+1].isdigit() or text[j+1] in '+-'):
+                j += 2
+                while j < n and text[j].isdigit():
+                    j += 1
+            toks.append((text[i:j], i))
+            i = j
+        elif c.isalpha() or c == '_':
+            j = i
+            while j < n and (text[j].isalpha() or text[j].isdigit() or text[j] == '_'):
+                j += 1
+            toks.append((text[i:j], i))
+            i = j
+        elif text[i:i+2] in OPS2:
+            toks.append((text[i:i+2], i))
+            i += 2
+        elif c in OPS1:
+            toks.append((c, i))
+            i += 1
+        else:
+            raise ValueError("expression: unexpected '{}' at {}".format(c, i))
+    toks.append(('', n))
+    return toks
+
+
+# recursive descent parser. Each rule returns the Python source of what it parsed and
+# whether it depends on x; parts that don't are hoisted out of the sample loop
+class Parser:
+
+    def __init__(self, text):
+        self.toks = tokens(text)
+        self.i = 0
+        self.used = set()   # parameters the expression reads
+        self.hoisted = []   # source of the values calculated once per fill
+
+    def peek(self):
+        return self.toks[self.i][0]
+
+    def next(self):
+        t = self.toks[self.i][0]
+        self.i += 1
+        return t
+
+    def error(self, what):
+        t, pos = self.toks[self.i]
+        raise ValueError("expression: {} at {}, found '{}'".format(what, pos, t or 'end'))
+
+    def expect(self, t):
+        if self.next() != t:
+            self.i -= 1
+            self.error("'{}' expected".format(t))
+
+    def parse(self):
+        src, dep = self.expr()
+        if self.peek():
+            self.error('end expected')
+        return src
+
+    # operands of an operation that depends on x, the constant ones are hoisted
+    def operands(self, parts):
+        if not any(dep for _, dep in parts):
+            return [src for src, _ in parts], False
+        return [self.hoist(src) if not dep else src for src, dep in parts], True
+
+    def hoist(self, src):
+        if src[:1] != '(' and '(' not in src:  # a name or a number already
+            return src
+        name = 'h{}'.format(len(self.hoisted))
+        self.hoisted.append((name, src))
+        return name
+
+    # a if c else b
+    def expr(self):
+        a = self.disjunction()
+        if self.peek() != 'if':
+            return a
+        self.next()
+        c = self.disjunction()
+        self.expect('else')
+        (a, c, b), dep = self.operands([a, c, self.expr()])
+        return '({} if {} else {})'.format(a, c, b), dep
+
+    def disjunction(self):
+        a = self.conjunction()
+        while self.peek() == 'or':
+            self.next()
+            (x, y), dep = self.operands([a, self.conjunction()])
+            a = '({} or {})'.format(x, y), dep
+        return a
+
+    def conjunction(self):
+        a = self.negation()
+        while self.peek() == 'and':
+            self.next()
+            (x, y), dep = self.operands([a, self.negation()])
+            a = '({} and {})'.format(x, y), dep
+        return a
+
+    def negation(self):
+        if self.peek() == 'not':
+            self.next()
+            src, dep = self.negation()
+            return '(not {})'.format(src), dep
+        return self.comparison()
+
+    def comparison(self):
+        a = self.sum()
+        if self.peek() not in COMPARE:
+            return a
+        parts = [a]
+        ops = []
+        while self.peek() in COMPARE:
+            ops.append(self.next())
+            parts.append(self.sum())
+        srcs, dep = self.operands(parts)
+        return '('+srcs[0]+''.join([op+src for op, src in zip(ops, srcs[1:])])+')', dep
+
+    def binary(self, a, op, b):
+        (x, y), dep = self.operands([a, b])
+        return '({}{}{})'.format(x, op, y), dep
+
+    def sum(self):
+        a = self.term()
+        while self.peek() in ('+', '-'):
+            op = self.next()
+            a = self.binary(a, op, self.term())
+        return a
+
+    def term(self):
+        a = self.unary()
+        while self.peek() in ('*', '/', '%'):
+            op = self.next()
+            a = self.binary(a, op, self.unary())
+        return a
+
+    def unary(self):
+        if self.peek() in ('-', '+'):
+            op = self.next()
+            src, dep = self.unary()
+            return '({}{})'.format(op, src), dep
+        return self.power()
+
+    def power(self):
+        a = self.atom()
+        if self.peek() in ('**', '^'):
+            self.next()
+            return self.binary(a, '**', self.unary())
+        return a
+
+    def atom(self):
+        t = self.peek()
+        if t == '(':
+            self.next()
+            a = self.expr()
+            self.expect(')')
+            return a
+        if t[:1].isdigit() or t[:1] == '.':
+            try:
+                v = float(t)
+            except ValueError:
+                self.error('number')
+            self.next()
+            return repr(v), False
+        if t == 'x':
+            self.next()
+            return 'x', True
+        if t in CONSTS:
+            self.next()
+            return repr(CONSTS[t]), False
+        if t == 'pars':
+            self.next()
+            self.expect('[')
+            k = self.next()
+            if k not in [str(i) for i in range(NPARS)]:
+                self.i -= 1
+                self.error('parameter index 0-{}'.format(NPARS-1))
+            self.expect(']')
+            return self.par(int(k))
+        if len(t) == 2 and t[0] == 'p' and t[1] in '0123456789'[:NPARS]:
+            self.next()
+            return self.par(int(t[1]))
+        if t in FUNCS:
+            self.next()
+            self.expect('(')
+            args = [self.expr()]
+            while self.peek() == ',':
+                self.next()
+                args.append(self.expr())
+            self.expect(')')
+            if len(args) != 1 and t not in ('min', 'max') or len(args) < 2 and t in ('min', 'max'):
+                self.error('arguments of {}'.format(t))
+            srcs, dep = self.operands(args)
+            return '{}({})'.format(t, ','.join(srcs)), dep
+        self.error('value')
+
+    def par(self, k):
+        self.used.add(k)
+        return 'p{}'.format(k), False
+
+
+# source of the wave function and of its kernel, same arithmetic as the kernels of
+# wave_kernels: amplitude, offset, the DAC scaling and the hoisted values calculated
+# before the sample loop. A hoisted value that can't be calculated (1/p2 with p2=0)
+# is nan, it only stops the fill if the branch that needs it is taken.
+FUNC = '''def f(x,pars):
+{pars} return {body}
+'''
+HOIST = ''' try: {name}={src}
+ except (ArithmeticError,ValueError): {name}=nan
+'''
+KERNEL = '''def k(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+ top=(1<<dacbits)-1
+ a=(1<<dacbits)*amplitude
+ b=(1<<dacbits)*offset
+ c=dup*replicate/nsamp
+{pars} for isamp in range(start,stop):
+  x=((isamp+0.5)*c)%1.0
+  v=int(({body})*a+b)
+  buf[isamp]=0 if v<0 else (top if v>top else v)
+'''
+
+# wave function of text, parsed and compiled on the first call only
+def compile_expr(text):
+    text = text.strip()
+    f = compiled.get(text)
+    if f is None:
+        p = Parser(text)
+        body = p.parse()
+        pars = ''.join([' p{0}=pars[{0}]\n'.format(k) for k in sorted(p.used)])
+        pars += ''.join([HOIST.format(name=name, src=src) for name, src in p.hoisted])
+        env = dict(FUNCS)
+        env['nan'] = float('nan')
+        exec(FUNC.format(pars=pars, body=body), env)
+        exec(KERNEL.format(pars=pars, body=body), env)
+        f = env['f']
+        wg.kernels[f] = env['k']
+        wg.fixed_kernels[f] = env['k']     # no integer form, the same kernel in both modes
+        compiled[text] = f
+    return f
+
+# eof
@@ -0,0 +1,181 @@
+# Fixed point waveform kernels for the AWG
+#
+# Integer-only versions of the wave_kernels, for the FPU-less RP2040.
+# Same signature as wave_kernels:
+#   kernel(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits)
+# Floats are only touched once per call to convert pars/amplitude/offset,
+# the sample loops use small ints (< 2**30) only, so they compile with the
+# @micropython.native emitter and keep clear of MicroPython long ints.
+#
+# number formats:
+#   x   sample position 0.0-1.0 in Q16, stepped by an exact quotient/remainder accumulator
+#   f   normalised function value in Q15 (ONE=32768)
+#   out (f*g+b)>>gb with g,b the DAC scaled amplitude and offset
+
+from array import array
+from math import exp
+from wave_lut import fill_sine, qsin, PHASE_BITS, PHASE_MASK, QUARTER, QUARTER_MASK, FRAC_BITS, FRAC_MASK, SCALE_BITS
+from wave_lut import AMP as QAMP
+from wave_noise import fill_noise, fill_gnoise, fill_pink    #already integer only
+
+try:
+    import micropython
+except ImportError:     # CPython host, emitter decorators do nothing
+    class micropython:
+        native=viper=staticmethod(lambda f: f)
+
+XBITS=16
+XONE=1<<XBITS
+XMASK=XONE-1
+XHALF=XONE>>1
+QBITS=15
+ONE=1<<QBITS
+
+#exp(-z) for z=0..16 in steps of 1/32, Q15, extra entry for the interpolation
+EXP_STEPS=5
+EXP_END=16
+expneg=array('h',[int(32767*exp(-i/(1<<EXP_STEPS))+0.5) for i in range((EXP_END<<EXP_STEPS)+1)])
+ZBITS=24                                 #exponent argument z in Q24
+ZSHIFT=ZBITS-EXP_STEPS
+ZMASK=(1<<ZSHIFT)-1
+ZEND=EXP_END<<ZBITS
+
+
+#integer gain, bias and shift so that out=(f*g+b)>>gb matches int(2**dacbits*(f*amplitude+offset))
+def _gain(amplitude,offset,dacbits):
+    return (int(amplitude*(1<<(SCALE_BITS-QBITS))+0.5),
+            int(offset*(1<<SCALE_BITS)),
+            SCALE_BITS-dacbits)
+
+#position of the first sample and the step in Q16 as quotient/remainder pairs,
+#rounded to nearest so mirrored samples get exactly mirrored positions
+def _xstep(start,nsamp,cycles):
+    num=((cycles*(2*start+1))<<(XBITS-1))+(nsamp>>1)
+    step=cycles<<XBITS
+    return (num//nsamp)&XMASK, num%nsamp, (step//nsamp)&XMASK, step%nsamp
+
+
+@micropython.native
+def fill_pulse(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    g,b,gb=_gain(amplitude,offset,dacbits)
+    x,r,xs,rs=_xstep(start,nsamp,dup*replicate)
+    rise=int(pars[0]*XONE)
+    upend=int((pars[0]+pars[1])*XONE)
+    fallend=int((pars[0]+pars[1]+pars[2])*XONE)
+    irise=(1<<30)//rise if rise else 0   #(x*irise)>>15 stays below 2**30 as x<rise
+    ifall=(1<<30)//(fallend-upend) if fallend>upend else 0
+    hi=(ONE*g+b)>>gb
+    hi=0 if hi<0 else (top if hi>top else hi)
+    lo=b>>gb
+    lo=0 if lo<0 else (top if lo>top else lo)
+    for isamp in range(start,stop):
+        if x<rise:
+            v=(((x*irise)>>15)*g+b)>>gb
+            buf[isamp]=0 if v<0 else (top if v>top else v)
+        elif x<upend:
+            buf[isamp]=hi
+        elif x<fallend:
+            v=((ONE-(((x-upend)*ifall)>>15))*g+b)>>gb
+            buf[isamp]=0 if v<0 else (top if v>top else v)
+        else:
+            buf[isamp]=lo
+        x+=xs
+        r+=rs
+        if r>=nsamp:
+            r-=nsamp
+            x+=1
+        x&=XMASK
+
+@micropython.native
+def fill_gaussian(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    g,b,gb=_gain(amplitude,offset,dacbits)
+    x,r,xs,rs=_xstep(start,nsamp,dup*replicate)
+    t=expneg
+    iw=int((1<<12)/pars[0])             #u=(x-0.5)/width in Q12 is (d*iw)>>16
+    dmax=int(4*pars[0]*XONE)            #exp(-16) is zero at 8 bits, keeps d*iw<2**30
+    for isamp in range(start,stop):
+        d=x-XHALF
+        if d<0: d=-d
+        if d<dmax:
+            u=(d*iw)>>16
+            z=u*u                       #Q24
+            i=z>>ZSHIFT
+            f=t[i]
+            fr=z&ZMASK
+            if fr: f+=((t[i+1]-f)*fr)>>ZSHIFT
+        else:
+            f=0
+        v=(f*g+b)>>gb
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+        x+=xs
+        r+=rs
+        if r>=nsamp:
+            r-=nsamp
+            x+=1
+        x&=XMASK
+
+@micropython.native
+def fill_exponential(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    g,b,gb=_gain(amplitude,offset,dacbits)
+    x,r,xs,rs=_xstep(start,nsamp,dup*replicate)
+    t=expneg
+    ip=int((1<<8)/pars[0])              #z=x/width in Q24 is x*ip
+    xmax=ZEND//ip if ip else XONE
+    for isamp in range(start,stop):
+        if x<xmax:
+            z=x*ip
+            i=z>>ZSHIFT
+            f=t[i]
+            fr=z&ZMASK
+            if fr: f+=((t[i+1]-f)*fr)>>ZSHIFT
+        else:
+            f=0
+        v=(f*g+b)>>gb
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+        x+=xs
+        r+=rs
+        if r>=nsamp:
+            r-=nsamp
+            x+=1
+        x&=XMASK
+
+@micropython.native
+def fill_sinc(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    g,b,gb=_gain(amplitude,offset,dacbits)
+    x,r,xs,rs=_xstep(start,nsamp,dup*replicate)
+    t=qsin
+    #phase of sin((x-0.5)/width) is d*kp, split in kh<<10+kl so no product leaves small ints
+    kp=int((1<<(PHASE_BITS-XBITS))/(6.283185307179586*pars[0])+0.5)
+    kh=kp>>10
+    kl=kp&1023
+    pw=int(pars[0]*XONE*ONE/QAMP+0.5)   #sin(t)/t in Q15 is s*pw//d
+    hi=(ONE*g+b)>>gb
+    hi=0 if hi<0 else (top if hi>top else hi)
+    for isamp in range(start,stop):
+        d=x-XHALF
+        if d==0:
+            buf[isamp]=hi
+        else:
+            ph=((((d*kh)&0xfffff)<<10)+d*kl)&PHASE_MASK
+            q=ph>>(PHASE_BITS-2)
+            pq=ph&QUARTER_MASK
+            if q&1: pq=QUARTER-pq
+            i=pq>>FRAC_BITS
+            s=t[i]
+            fr=pq&FRAC_MASK
+            if fr: s+=((t[i+1]-s)*fr)>>FRAC_BITS
+            if q&2: s=-s
+            v=((s*pw//d)*g+b)>>gb
+            buf[isamp]=0 if v<0 else (top if v>top else v)
+        x+=xs
+        r+=rs
+        if r>=nsamp:
+            r-=nsamp
+            x+=1
+        x&=XMASK
+
+# eof
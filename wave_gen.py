@@ -7,7 +7,7 @@
 # version 3-Nov-2021 enabled duplication and changed to 8-bit DAC
 #                                                       ---------
 
-from machine import Pin, mem32, freq
+from machine import Pin, mem32, freq, disable_irq, enable_irq
 from rp2 import PIO, StateMachine, asm_pio
 from array import array
 from math import pi, sin, exp, sqrt, floor
@@ -17,7 +17,16 @@ import struct
 import gc
 import sys
 import utime
-from ui import maxsamp
+from wave_config import maxsamp, fill_budget_ms, max_spp
+import wave_arena
+from wave_kernels import fill_sine, fill_pulse, fill_gaussian, fill_sinc, fill_exponential, fill_noise, fill_gnoise, fill_pink
+from wave_kernels import EVEN, QUARTER, fill_unit, tile, rescale, SHAPE_BITS, SHAPE_AMPLITUDE, SHAPE_OFFSET
+import wave_fixed
+import wave_noise
+import wave_plan
+from wave_cache import WaveCache
+from wave_spec import snapshot
+from wave_trace import SetupTrace
 
 
 #define AWG base constants
@@ -25,6 +34,12 @@ DACbits=8 #Number of nits in the DAC / R2R Ladder Network
 maxDACvalue=(2**DACbits)-1
 fclock=freq() #clock frequency of the pico
 
+#buffers allocated at boot (see wave_arena), their size replaces the fixed maxsamp
+arena=wave_arena.arena
+minsamp=maxsamp
+if arena:
+    maxsamp=arena.size
+
 #print('0 wavegen: fclock= ', str(fclock/1000000), ' MHz')
 
 # use DMA channels 2 and 3 as ch0 and ch1 are used by preriferals such as SPI for the display
@@ -41,10 +56,32 @@ CH3_WRITE_ADDR =DMA_BASE+0x0c4
 CH3_TRANS_COUNT=DMA_BASE+0x0c8
 CH3_CTRL_TRIG  =DMA_BASE+0x0cc
 CH3_AL1_CTRL   =DMA_BASE+0x0d0
+CH3_AL3_READ_ADDR_TRIG=DMA_BASE+0x0fc
+
+CH4_READ_ADDR  =DMA_BASE+0x100
+CH4_WRITE_ADDR =DMA_BASE+0x104
+CH4_TRANS_COUNT=DMA_BASE+0x108
+CH4_AL1_CTRL   =DMA_BASE+0x110
+
+CH5_READ_ADDR  =DMA_BASE+0x140
+CH5_WRITE_ADDR =DMA_BASE+0x144
+CH5_TRANS_COUNT=DMA_BASE+0x148
+CH5_AL1_CTRL   =DMA_BASE+0x150
+
+CH6_READ_ADDR  =DMA_BASE+0x180
+CH6_WRITE_ADDR =DMA_BASE+0x184
+CH6_TRANS_COUNT=DMA_BASE+0x188
+CH6_CTRL_TRIG  =DMA_BASE+0x18c
+CH6_AL1_CTRL   =DMA_BASE+0x190
 
 PIO0_BASE      =0x50200000
+PIO0_CTRL      =PIO0_BASE+0x000
 PIO0_TXF0      =PIO0_BASE+0x10
+PIO0_TXF1      =PIO0_BASE+0x14
 PIO0_SM0_CLKDIV=PIO0_BASE+0xc8
+PIO0_SM0_SHIFTCTRL=PIO0_BASE+0xd0
+PIO0_SM1_CLKDIV=PIO0_BASE+0xe0
+PIO0_SM1_SHIFTCTRL=PIO0_BASE+0xe8
 
 
 #state machine that just pushes bytes to the 10 pins
@@ -63,10 +100,20 @@ sm.active(1)
 
 #2-channel chained DMA. channel 0 does the transfer, channel 1 reconfigures
 p=array('I',[0]) #global 1-element array
+playing=None     #buffer the DMA chain is playing, None when stopped
+playing_nword=0  #and its length in words
+playing_key=None #samples in the playing buffer, see samplekey
+playing_dup=1    #and the periods they hold
 def startDMA(ar,nword):
     #first disable the DMAs to prevent corruption while writing
     mem32[CH3_AL1_CTRL]=0
     mem32[CH2_AL1_CTRL]=0
+    mem32[CH4_AL1_CTRL]=0  #a sequence may have played
+    mem32[CH5_AL1_CTRL]=0  #and channel B
+    mem32[CH6_AL1_CTRL]=0
+    global sequencing, dual_playing
+    sequencing=False
+    dual_playing=False
     #setup first DMA which does the actual transfer
     mem32[CH2_READ_ADDR]=addressof(ar)
     mem32[CH2_WRITE_ADDR]=PIO0_TXF0
@@ -81,7 +128,7 @@ def startDMA(ar,nword):
     DATA_SIZE=2   #32-bit word transfer
     HIGH_PRIORITY=1
     EN=1
-    CTRL0=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(RING_SEL<<10)|(RING_SIZE<<9)|(INCR_WRITE<<5)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
+    CTRL0=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(RING_SEL<<10)|(RING_SIZE<<6)|(INCR_WRITE<<5)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
     mem32[CH2_AL1_CTRL]=CTRL0
     #setup second DMA which reconfigures the first channel
     p[0]=addressof(ar)
@@ -98,57 +145,640 @@ def startDMA(ar,nword):
     DATA_SIZE=2   #32-bit word transfer
     HIGH_PRIORITY=1
     EN=1
-    CTRL1=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(RING_SEL<<10)|(RING_SIZE<<9)|(INCR_WRITE<<5)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
+    CTRL1=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(RING_SEL<<10)|(RING_SIZE<<6)|(INCR_WRITE<<5)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
     mem32[CH3_CTRL_TRIG]=CTRL1
+    global playing, playing_nword, ring_playing
+    playing=ar
+    playing_nword=nword
+    ring_playing=False
 
 
 def stopDMA():
     #disable the DMAs to prevent corruption while writing
     mem32[CH2_AL1_CTRL]=0
     mem32[CH3_AL1_CTRL]=0
-
+    mem32[CH4_AL1_CTRL]=0
+    mem32[CH5_AL1_CTRL]=0
+    mem32[CH6_AL1_CTRL]=0
+    global playing, streaming, ring_playing, sequencing, dual_playing
+    playing=None
+    streaming=False
+    ring_playing=False
+    sequencing=False
+    dual_playing=False
+
+#switch the running DMA chain over to a new buffer without stopping it.
+#CH2 reloads its transfer count on every trigger and CH3 writes p[0] into
+#CH2_READ_ADDR before it triggers CH2, so both writes below take effect
+#together at the end of the current pass. They are only made while enough
+#words of the pass are left that the reload can't fall between them.
+#Should a reload still slip in between at the highest output rates, that one
+#pass plays the new buffer with the old count; both buffers hold maxsamp bytes,
+#so it never reads outside a buffer.
+#Both waits last at most one pass of the playing buffer at its divider, so at low
+#frequencies the caller only changes the clock once the new buffer plays. Interrupts
+#are only disabled for the two writes.
+SWITCH_MARGIN=16 #words left in the current pass
+def switchDMA(ar,nword,wait=True):
+    global playing, playing_nword
+    addr=addressof(ar)
+    margin=min(SWITCH_MARGIN,playing_nword>>1)
+    limit=pass_us()
+    t0=utime.ticks_us()
+    while True:
+        irq=disable_irq()
+        if mem32[CH2_TRANS_COUNT]>=margin or utime.ticks_diff(utime.ticks_us(),t0)>limit:
+            break #live count of words left in this pass
+        enable_irq(irq)
+    mem32[CH2_TRANS_COUNT]=nword  #reload value for the next trigger
+    p[0]=addr
+    enable_irq(irq)
+    if wait: #wait for CH3 to hand the new buffer to CH2, so the caller can change the clock at the boundary
+        t0=utime.ticks_us()
+        while utime.ticks_diff(utime.ticks_us(),t0)<=limit:
+            if switched(ar,nword):
+                break
+    playing=ar
+    playing_nword=nword
+
+
+#ring mode: CH2 alone plays a buffer of 2**k bytes aligned to its size (the arena
+#buffers are, see wave_arena), its read address wraps in the buffer (RING_SIZE).
+#No reload by CH3 and no arbitration gap at the end of a pass, CH3 stays free.
+#The transfer count is the largest there is: 2**32 words last 137 s at clkdiv 1
+#and longer at larger dividers, ring_poll starts CH2 again where it stopped.
+RING_COUNT=0xffffffff
+CH2_BUSY=1<<24
+ring_dma=arena is not None #play waves of 2**k samples in ring mode, see wave_plan
+ring_playing=False
+def startRing(ar,nword):
+    #first disable the DMAs to prevent corruption while writing
+    mem32[CH3_AL1_CTRL]=0
+    mem32[CH2_AL1_CTRL]=0
+    mem32[CH4_AL1_CTRL]=0  #a sequence may have played
+    mem32[CH5_AL1_CTRL]=0  #and channel B
+    mem32[CH6_AL1_CTRL]=0
+    global sequencing, dual_playing
+    sequencing=False
+    dual_playing=False
+    mem32[CH2_READ_ADDR]=addressof(ar)
+    mem32[CH2_WRITE_ADDR]=PIO0_TXF0
+    mem32[CH2_TRANS_COUNT]=RING_COUNT
+    IRQ_QUIET=0x1 #do not generate an interrupt
+    TREQ_SEL=0x00 #wait for PIO0_TX0
+    CHAIN_TO=2    #itself, no chaining
+    RING_SEL=0    #wrap the read address
+    RING_SIZE=2   #in the 4*nword bytes of the buffer
+    while 1<<RING_SIZE<4*nword:
+        RING_SIZE+=1
+    INCR_WRITE=0  #for write to array
+    INCR_READ=1   #for read from array
+    DATA_SIZE=2   #32-bit word transfer
+    HIGH_PRIORITY=1
+    EN=1
+    CTRL0=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(RING_SEL<<10)|(RING_SIZE<<6)|(INCR_WRITE<<5)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
+    mem32[CH2_CTRL_TRIG]=CTRL0
+    global playing, playing_nword, ring_playing
+    playing=ar
+    playing_nword=nword
+    ring_playing=True
+
+#restart CH2 when its transfer count has run out, the read address is still in the ring
+def ring_poll():
+    if ring_playing and not mem32[CH2_AL1_CTRL]&CH2_BUSY:
+        mem32[CH2_CTRL_TRIG]=mem32[CH2_AL1_CTRL]&0xffffff
+
+#move the ring to a new buffer of the same size at the same place in the period.
+#A word the DMA reads between the two accesses plays once more.
+def switchRing(ar,nword):
+    global playing
+    addr=addressof(ar)
+    irq=disable_irq()
+    mem32[CH2_READ_ADDR]=addr|(mem32[CH2_READ_ADDR]&(4*nword-1))
+    enable_irq(irq)
+    playing=ar
+
+def ringable(ar,nword):
+    return ring_dma and wave_plan.ringable(4*nword) and not addressof(ar)&(4*nword-1)
+
+#start playing ar in ring mode when it allows, with the chained pair otherwise
+def startplay(ar,nword):
+    if ringable(ar,nword):
+        startRing(ar,nword)
+    else:
+        startDMA(ar,nword)
+
+#switch the running output to ar. Ring to ring of the same size and chained pair to
+#chained pair don't interrupt it, a change of mode restarts the DMA (a short gap)
+#True once CH2 plays from ar, the chained pair has handed it over
+def switched(ar,nword):
+    addr=addressof(ar)
+    return addr<=(mem32[CH2_READ_ADDR]&0xffffffff)<=addr+4*nword
+
+#microseconds one pass of the playing buffer takes at the current divider, plus a margin
+def pass_us():
+    return int(4*playing_nword*getclkdiv()*1000000/fclock)+100
+
+#wait only when the caller changes the divider after the switch, the ring switches at once
+def switchplay(ar,nword,wait=True):
+    if ringable(ar,nword):
+        if ring_playing and nword==playing_nword:
+            switchRing(ar,nword)
+        else:
+            startRing(ar,nword)
+    elif ring_playing:
+        startDMA(ar,nword)
+    else:
+        switchDMA(ar,nword,wait)
+
+
+#streaming noise: the DMA plays two blocks in turn while stream_poll calculates
+#fresh noise into the block that has just been played, so the output never repeats.
+#CH2 plays one block and raises its completion flag in DMA_INTR (no interrupt
+#handler, the flag is polled). CH3 reads the next block address from a two-entry
+#list with an 8 byte read ring, so the hardware alternates the blocks on its own
+#and a late producer only replays old samples, the DMA never leaves the blocks.
+DMA_INTR=DMA_BASE+0x400 #raw completion flags, write 1 to clear
+CH2_DONE=1<<2
+STREAM_MARGIN=1.5 #producer must be this much faster than the DMA
+stream_noise=True #noise waveforms stream instead of looping one buffer
+streaming=False
+stream_bufs=None
+stream_kernel=None
+stream_w=None
+stream_clkdiv=1
+stream_rate=0     #samples/s the producer sustains, measured at set up
+stream_underruns=0
+pp=array('I',[0,0,0,0]) #block address list, an 8 byte aligned pair is used for the ring
+def startStream(bufs,nword):
+    global streaming
+    stopDMA()
+    base=addressof(pp)
+    a=(base+7)&~7
+    i=(a-base)>>2
+    pp[i]=addressof(bufs[0])
+    pp[i+1]=addressof(bufs[1])
+    mem32[DMA_INTR]=CH2_DONE
+    #first DMA plays one block and flags its completion
+    mem32[CH2_READ_ADDR]=pp[i]
+    mem32[CH2_WRITE_ADDR]=PIO0_TXF0
+    mem32[CH2_TRANS_COUNT]=nword
+    IRQ_QUIET=0x0 #set the completion flag
+    TREQ_SEL=0x00 #wait for PIO0_TX0
+    CHAIN_TO=3    #start channel 1 when done
+    RING_SEL=0
+    RING_SIZE=0   #no wrapping
+    INCR_WRITE=0  #for write to array
+    INCR_READ=1   #for read from array
+    DATA_SIZE=2   #32-bit word transfer
+    HIGH_PRIORITY=1
+    EN=1
+    CTRL0=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(RING_SEL<<10)|(RING_SIZE<<6)|(INCR_WRITE<<5)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
+    mem32[CH2_AL1_CTRL]=CTRL0
+    #second DMA hands the address of the other block to the first channel
+    mem32[CH3_READ_ADDR]=a+4
+    mem32[CH3_WRITE_ADDR]=CH2_READ_ADDR
+    mem32[CH3_TRANS_COUNT]=1
+    IRQ_QUIET=0x1 #do not generate an interrupt
+    TREQ_SEL=0x3f #no pacing
+    CHAIN_TO=2    #start channel 0 when done
+    RING_SEL=0    #wrap the read address
+    RING_SIZE=3   #in 8 bytes, the two block addresses
+    INCR_WRITE=0  #single write
+    INCR_READ=1   #next address
+    DATA_SIZE=2   #32-bit word transfer
+    HIGH_PRIORITY=1
+    EN=1
+    CTRL1=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(RING_SEL<<10)|(RING_SIZE<<6)|(INCR_WRITE<<5)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
+    mem32[CH3_CTRL_TRIG]=CTRL1
+    streaming=True
+
+#refill the block the DMA has finished, call it as often as possible while streaming.
+#returns True when a block was refilled. When the DMA finishes the next block before the
+#refill is done, parts of it played old samples: the underrun is counted and the sample
+#rate lowered by a quarter.
+def stream_poll():
+    global stream_underruns, stream_clkdiv
+    if not streaming or not mem32[DMA_INTR]&CH2_DONE:
+        return False
+    mem32[DMA_INTR]=CH2_DONE
+    a=addressof(stream_bufs[1])
+    n=len(stream_bufs[1])
+    live=1 if a<=(mem32[CH2_READ_ADDR]&0xffffffff)<a+n else 0
+    buf=stream_bufs[1-live]
+    w=stream_w
+    stream_kernel(buf,0,n,n,1,1,w['pars'],w['amplitude'],w['offset'],DACbits)
+    if mem32[DMA_INTR]&CH2_DONE:
+        stream_underruns+=1
+        stream_clkdiv=setclkdiv(stream_clkdiv+(stream_clkdiv>>2)+1)
+        w['F_out']=fclock/stream_clkdiv/maxsamp
+    return True
+
+#set up streaming noise into the two blocks in bufs, both a multiple of 4 bytes long.
+#the sample rate follows the frequency like a looped buffer of maxsamp samples would,
+#but is lowered to what the producer sustains.
+def setupstream(bufs,w):
+    global stream_bufs, stream_kernel, stream_w, stream_clkdiv, stream_rate, stream_underruns, upload_buf
+    t=trace
+    if t: t.begin('setupstream',w)
+    w['AWG_status']='calc wave'
+    stopDMA()
+    upload_buf=None  #the blocks fill the sample buffers
+    kernel=synth_kernels[synthmode][w['func']]
+    n=len(bufs[0])
+    t0=utime.ticks_us()
+    kernel(bufs[0],0,n,n,1,1,w['pars'],w['amplitude'],w['offset'],DACbits)
+    dt=utime.ticks_diff(utime.ticks_us(),t0)
+    kernel(bufs[1],0,n,n,1,1,w['pars'],w['amplitude'],w['offset'],DACbits)
+    stream_rate=n*1000000//max(1,dt)
+    if t:
+        t.phase('fill')
+        t.note('path','stream')
+    clkdiv=max(1,int(fclock/(w['frequency']*maxsamp)+0.5))
+    clkdiv=max(clkdiv,int(fclock*STREAM_MARGIN/stream_rate)+1)
+    stream_bufs=bufs
+    stream_kernel=kernel
+    stream_w=w
+    stream_underruns=0
+    stream_clkdiv=setclkdiv(clkdiv)
+    gc.collect()
+    if t: t.phase('gc')
+    startStream(bufs,n>>2)
+    if t:
+        t.phase('dma')
+        t.end(2*n,1,stream_clkdiv)
+    w['nsamp']=2*n
+    w['F_out']=fclock/stream_clkdiv/maxsamp
+    w['AWG_status']='running'
+
+def stream_stats():
+    return {'streaming' : streaming, 'sample rate' : fclock//stream_clkdiv if streaming else 0,
+            'sustained' : stream_rate, 'underruns' : stream_underruns, 'clkdiv' : stream_clkdiv}
+
+
+#sequences: segments in one buffer pool play one after the other, the DMA walks a
+#table of control blocks (see wave_seq). Each block holds the four CH2 registers of
+#alias 1: CTRL, READ_ADDR, WRITE_ADDR and TRANS_COUNT_TRIG. CH3 copies one block to
+#CH2 (a 16 byte write ring over the alias) and the last write starts CH2, CH2 chains
+#back to CH3 for the next block. The last block chains to CH4 instead, which points
+#CH3 at the start of the table again (a loop), or to nothing (a burst, its end sets
+#the CH2 flag in DMA_INTR). No CPU involvement and no gap between segments.
+sequencing=False
+
+#control word of CH2 for a block of a sequence
+def seqctrl(chain_to,irq_quiet=1):
+    TREQ_SEL=0x00 #wait for PIO0_TX0
+    INCR_READ=1   #for read from array
+    DATA_SIZE=2   #32-bit word transfer
+    HIGH_PRIORITY=1
+    EN=1
+    return (irq_quiet<<21)|(TREQ_SEL<<15)|(chain_to<<11)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
+
+#play the control blocks in table at clkdiv, start holds the table address for CH4
+def startSequence(table,start,clkdiv):
+    global sequencing, upload_buf
+    stopDMA()
+    upload_buf=None  #the pool may overlap the sample buffers
+    setclkdiv(clkdiv)
+    mem32[DMA_INTR]=CH2_DONE
+    #loop channel: restarts CH3 at the first block, triggered by the chain of the last one
+    mem32[CH4_READ_ADDR]=addressof(start)
+    mem32[CH4_WRITE_ADDR]=CH3_AL3_READ_ADDR_TRIG
+    mem32[CH4_TRANS_COUNT]=1
+    IRQ_QUIET=0x1 #do not generate an interrupt
+    TREQ_SEL=0x3f #no pacing
+    CHAIN_TO=4    #itself, no chaining
+    DATA_SIZE=2   #32-bit word transfer
+    HIGH_PRIORITY=1
+    EN=1
+    mem32[CH4_AL1_CTRL]=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
+    #control channel: copies one block into the CH2 registers per trigger
+    mem32[CH3_READ_ADDR]=addressof(table)
+    mem32[CH3_WRITE_ADDR]=CH2_AL1_CTRL
+    mem32[CH3_TRANS_COUNT]=4
+    IRQ_QUIET=0x1 #do not generate an interrupt
+    TREQ_SEL=0x3f #no pacing
+    CHAIN_TO=3    #itself, the block starts CH2
+    RING_SEL=1    #wrap the write address
+    RING_SIZE=4   #in the 16 bytes of alias 1
+    INCR_WRITE=1  #next register
+    INCR_READ=1   #next table word
+    DATA_SIZE=2   #32-bit word transfer
+    HIGH_PRIORITY=1
+    EN=1
+    CTRL1=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(RING_SEL<<10)|(RING_SIZE<<6)|(INCR_WRITE<<5)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
+    mem32[CH3_CTRL_TRIG]=CTRL1
+    sequencing=True
+
+#True once a burst has played its last block
+def sequence_done():
+    return sequencing and bool(mem32[DMA_INTR]&CH2_DONE)
+
+
+#two channels: state machine 1 plays a second buffer on the 8 pins from pins on,
+#through CH5 and CH6 chained like CH2 and CH3 (see wave_dual). Both state machines
+#are stopped, their FIFOs flushed and their output shift registers emptied, then the
+#DMA fills both FIFOs and one write of PIO0_CTRL enables the two state machines and
+#restarts their dividers together: the first samples of both buffers come out on the
+#same clock cycle. Same divider and same buffer length keep them locked from then on.
+sm_b=None   #state machine of channel B, made on first use as it takes over its pins
+dual_playing=False
+pb=array('I',[0]) #buffer address CH6 reloads CH5 with
+def startDual(bufa,bufb,nword,clkdiv,pins):
+    global sm_b, dual_playing, playing
+    if sm_b is None:
+        sm_b=StateMachine(1, stream, freq=fclock, out_base=Pin(pins))
+    mem32[PIO0_CTRL]=0  #both state machines stop, the pins hold their sample
+    stopDMA()
+    for reg in (PIO0_SM0_SHIFTCTRL,PIO0_SM1_SHIFTCTRL):
+        for _ in range(2):  #toggling FJOIN_RX flushes both FIFOs
+            mem32[reg]=mem32[reg]^(1<<31)
+    sm.exec('out(null, 32)')  #drop what is left of the last word
+    sm_b.exec('out(null, 32)')
+    clkdiv_used=setclkdiv(clkdiv)
+    mem32[PIO0_SM1_CLKDIV]=mem32[PIO0_SM0_CLKDIV]
+    startDMA(bufa,nword)
+    #channel B, the same chained pair on CH5 and CH6
+    mem32[CH5_READ_ADDR]=addressof(bufb)
+    mem32[CH5_WRITE_ADDR]=PIO0_TXF1
+    mem32[CH5_TRANS_COUNT]=nword
+    IRQ_QUIET=0x1 #do not generate an interrupt
+    TREQ_SEL=0x01 #wait for PIO0_TX1
+    CHAIN_TO=6    #start channel 6 when done
+    INCR_READ=1   #for read from array
+    DATA_SIZE=2   #32-bit word transfer
+    HIGH_PRIORITY=1
+    EN=1
+    mem32[CH5_AL1_CTRL]=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
+    pb[0]=addressof(bufb)
+    mem32[CH6_READ_ADDR]=addressof(pb)
+    mem32[CH6_WRITE_ADDR]=CH5_READ_ADDR
+    mem32[CH6_TRANS_COUNT]=1
+    TREQ_SEL=0x3f #no pacing
+    CHAIN_TO=5    #start channel 5 when done
+    INCR_READ=0   #single read
+    mem32[CH6_CTRL_TRIG]=(IRQ_QUIET<<21)|(TREQ_SEL<<15)|(CHAIN_TO<<11)|(INCR_READ<<4)|(DATA_SIZE<<2)|(HIGH_PRIORITY<<1)|(EN<<0)
+    CLKDIV_RESTART=0x3<<8 #state machines 0 and 1
+    SM_ENABLE=0x3
+    mem32[PIO0_CTRL]=CLKDIV_RESTART|SM_ENABLE
+    playing=None  #a set up of a single wave starts channel A on its own again
+    dual_playing=True
+    return clkdiv_used
+
+
+#uploaded samples (wave_upload) are received straight into the buffer the next set up
+#plays and set up as the function arbitrary, like waves loaded from flash (wave_store). They play as they are: planwave only
+#chooses the divider for upload_nsamp samples of upload_periods periods, makewave leaves
+#them in place or copies them from the buffer that holds them (upload_buf).
+#What describes the samples is kept here, not in the pars of the wave: the ui adjusters
+#write those in place.
+upload_buf=None  #buffer holding the uploaded samples, None once they are overwritten
+upload_nsamp=0
+upload_periods=1 #periods the samples hold
+upload_crc=None  #CRC-32 of the samples, tells uploads apart in samplekey
+
+#buffer of bufs the next set up fills, the one that isn't playing
+def nextbuf(bufs):
+    if len(bufs)<2:
+        return bufs[0]
+    return bufs[1] if playing is bufs[0] else bufs[0]
+
+#nsamp uploaded samples of periods periods are in buf
+def set_upload(buf,nsamp,periods,crc):
+    global upload_buf, upload_nsamp, upload_periods, upload_crc
+    upload_buf=buf
+    upload_nsamp=nsamp
+    upload_periods=periods
+    upload_crc=crc
+
+#makewave of the function arbitrary
+def upload_samples(buf,nsamp):
+    global upload_buf
+    if upload_buf is None:
+        raise ValueError('no uploaded samples, upload them again')
+    if buf is not upload_buf:
+        memoryview(buf)[0:nsamp]=memoryview(upload_buf)[0:nsamp]
+        upload_buf=buf
+    return 'upload'
+
+#the sample buffers are about to be written outside a set up: streaming and sequences
+#play from them, and a cancelled async set up may still be calculating on core 1
+def free_buffers():
+    if streaming or sequencing:
+        stopDMA()
+    if worker:
+        worker.join()
+
+#buf gets other samples
+def overwrite(buf):
+    global upload_buf
+    if buf is upload_buf:
+        upload_buf=None
+
+
+#choose clock division, number of samples and duplication for the requested frequency,
+#see wave_plan. The fractional divider is opt-in: more accurate frequencies, but
+#every sample then lasts either of two whole numbers of clock cycles (jitter).
+fractional_clkdiv=False
+def planwave(w):
+    if w['func'] is arbitrary: #uploaded samples play as they are, only the divider is chosen
+        return wave_plan.fixed(w['frequency'],fclock,upload_nsamp,upload_periods,fractional_clkdiv)
+    return wave_plan.plan(w['frequency'],fclock,samplelimit(w),fractional_clkdiv,ring_dma)
+
+#largest sample count of a set up. More samples give a finer time resolution but take
+#longer to calculate: limited by the buffers (maxsamp, the arena size), by max_spp
+#and by the samples the function fills in fill_budget_ms at its last measured rate,
+#rounded down to a power of two so the limit (and the plan memo) stays put while the
+#rate varies. Never below the fixed buffer size of wave_config (minsamp), nor below
+#the samples a low frequency needs at the largest divider.
+fill_rates={}  #func -> samples per ms of its last calculation, see makewave
+def samplelimit(w):
+    n=min(max_spp,maxsamp)
+    rate=fill_rates.get(w['func'])
+    if rate:
+        budget=int(rate*fill_budget_ms)
+        step=4
+        while step*2<=budget:
+            step*=2
+        n=min(n,step)
+    f=w['frequency']
+    if f>0: #slowest the divider plays a sample
+        n=max(n,(int(-(-fclock//(f*wave_plan.CLKDIV_MAX)))+3)&~3)
+    return min(maxsamp,max(minsamp,n))&~3
+
+#calculate the repeating unit of the wave into buf, returns its length in samples
+#split=True shares the kernel calls with the second core when there is a worker
+def fillunit(buf,w,nsamp,dup,amplitude,offset,dacbits,split=True):
+    kernel=synth_kernels[synthmode].get(w['func'])
+    if kernel in aperiodic:
+        kernel(buf,0,nsamp,nsamp,dup,w['replicate'],w['pars'],amplitude,offset,dacbits)
+        return nsamp
+    elif kernel:  #whole-buffer kernel, only the repeating unit is calculated, see wave_kernels
+        if split and worker and kernel is not fill_sine: #table sine is quicker than a hand over
+            kernel=worker.split(kernel)
+        return fill_unit(kernel,buf,nsamp,dup,w['replicate'],w['pars'],amplitude,offset,dacbits,
+                         symmetry.get(w['func'],0))
+    else:       #any other function goes through eval sample by sample
+        fill_eval(w['func'],buf,0,nsamp,nsamp,dup,w['replicate'],w['pars'],amplitude,offset,dacbits)
+        return nsamp
+
+#samples start..stop of any function, the kernel arguments after func.
+#Same arithmetic as eval, with the wave parameters in locals instead of looked up per sample
+def fill_eval(func,buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits):
+    top=(1<<dacbits)-1
+    scale=2**dacbits
+    for isamp in range(start,stop):
+        x=dup*(isamp+0.5)/nsamp*replicate
+        x=x-floor(x)  #reduce x to 0.0-1.0 range
+        buf[isamp] = max(0,min(top,int(scale*(func(x,pars)*amplitude+offset))))
+
+#calculate nsamp samples of the wave into buf
+def fillwave(buf,w,nsamp,dup):
+    unit=fillunit(buf,w,nsamp,dup,w['amplitude'],w['offset'],DACbits)
+    tile(buf,unit,nsamp)
+
+#recently calculated buffers, a hit copies the samples instead of calculating them
+cache=WaveCache()
+
+#second core, see wave_worker. None: core 0 calculates alone
+worker=None
+
+def set_worker(wk):
+    global worker
+    if worker:
+        worker.join()
+    worker=wk
+
+#phase timing of the recent set ups, None while tracing is off, see wave_trace
+trace=None
+
+def set_trace(size=8):
+    global trace
+    trace=SetupTrace(size) if size else None
+
+def trace_summary():
+    return trace.summary() if trace else ''
+
+#normalised copy of the repeating unit of the last wave, compact 16-bit integers
+#(see wave_kernels.rescale). A set up that only changes amplitude or offset
+#rescales it into the buffer instead of evaluating the function again.
+shape=arena.shape if arena else array('H',bytearray(2*maxsamp)) #maxsamp 16-bit values
+shape_unit=0
+shape_key=None   #shape of the wave in shape[], None if not calculated
+last_shape=None  #shape of the last wave set up
+
+def shapekey(w,nsamp,dup):
+    s=snapshot(w)
+    return (s.func,s.pars,s.replicate,nsamp,dup,synthmode)
+
+#fill buf with the new wave: rescale the stored shape if only amplitude/offset changed,
+#copy it from the cache or calculate it. Returns how: 'rescale', 'cache' or 'calc'
+def makewave(buf,w,nsamp,dup,clkdiv):
+    global shape_unit, shape_key, last_shape
+    if worker:  #a cancelled async set up may still be calculating on core 1
+        worker.join()
+    if w['func'] is arbitrary:
+        return upload_samples(buf,nsamp)
+    overwrite(buf)
+    skey=shapekey(w,nsamp,dup)
+    if skey==shape_key or skey==last_shape:
+        if skey!=shape_key:  #second set up of a cached wave, keep its normalised copy from now on
+            shape_unit=fillunit(shape,w,nsamp,dup,SHAPE_AMPLITUDE,SHAPE_OFFSET,SHAPE_BITS)
+            shape_key=skey
+        rescale(buf,shape,shape_unit,w['amplitude'],w['offset'],DACbits)
+        tile(buf,shape_unit,nsamp)
+        last_shape=skey
+        return 'rescale'
+    last_shape=skey
+    key=cache.key(w,nsamp,dup,clkdiv,synthmode)
+    data=cache.get(key)
+    if data is None:  #calculate the normalised shape, every later amplitude or offset only rescales it
+        t0=utime.ticks_us()
+        shape_unit=fillunit(shape,w,nsamp,dup,SHAPE_AMPLITUDE,SHAPE_OFFSET,SHAPE_BITS)
+        shape_key=skey
+        rescale(buf,shape,shape_unit,w['amplitude'],w['offset'],DACbits)
+        tile(buf,shape_unit,nsamp)
+        fill_rates[w['func']]=nsamp*1000/max(1,utime.ticks_diff(utime.ticks_us(),t0))
+        cache.put(key,memoryview(buf)[0:nsamp])
+        return 'calc'
+    memoryview(buf)[0:nsamp]=data
+    return 'cache'
+
+#samples of a wave, set ups with the same key only differ in frequency
+def samplekey(w,nsamp,dup):
+    if w['func'] is arbitrary: #the upload, its pars don't describe it
+        return (arbitrary,upload_crc,nsamp,dup)
+    return (snapshot(w),nsamp,dup,synthmode)
+
+#CLKDIV register value of a clock divider
+def clkdivword(clkdiv):
+    d=min(int(clkdiv*256+0.5),(65535<<8)|255)
+    return ((d>>8)<<16)|((d&255)<<8)
+
+#set the clock divider, returns the divider actually used
+def setclkdiv(clkdiv):
+    r=clkdivword(clkdiv)
+    mem32[PIO0_SM0_CLKDIV]=r #fractional clock division results in jitter, only planned with fractional_clkdiv
+    return (r>>16)+((r>>8)&255)/256 if r&0xff00 else r>>16
+
+#True if the divider setclkdiv(clkdiv) sets differs from the running one
+def newclkdiv(clkdiv):
+    return clkdivword(clkdiv)!=mem32[PIO0_SM0_CLKDIV]&0xffffffff
+
+#clock divider the state machine runs with
+def getclkdiv():
+    r=mem32[PIO0_SM0_CLKDIV]
+    return (r>>16)+((r>>8)&255)/256 if r&0xff00 else r>>16
 
 
 def setupwave(buf,w):
-
+    global playing_key, playing_dup
+    if stream_noise and w['func'] in streamed: #noise streams through the two halves of buf
+        h=(len(buf)>>3)<<2
+        setupstream((memoryview(buf)[0:h],memoryview(buf)[h:2*h]),w)
+        return
+    if streaming:
+        stopDMA()
+
+    t=trace
+    if t: t.begin('setupwave',w)
     w['AWG_status'] = 'calc wave'
-    f=w['frequency']
-    maxnsamp = maxsamp
-
-    div=fclock/(f*maxnsamp) # required clock division for maximum buffer size
-    if div<1.0:  #can't speed up clock, duplicate wave instead
-        dup=int(1.0/div)
-        nsamp=int((maxnsamp*div*dup+0.5)/4)*4 #force multiple of 4
-        clkdiv=1
-        
-    else:        #stick with integer clock division only
-        clkdiv=int(div)+1
-        nsamp=int((maxnsamp*div/clkdiv+0.5)/4)*4 #force multiple of 4
-        dup=1
-    #print('1 fill the buffer: f= ', f, 'maxnsamp= ', maxnsamp, 'nsamp= ', nsamp, 'dup= ', dup)
-    #print('nsamp= ', nsamp, 'dup= ', dup)
-
-
+    nsamp,dup,clkdiv=planwave(w)
+    key=samplekey(w,nsamp,dup)
+    if t: t.phase('plan')
 
     try:
-        for isamp in range(nsamp):
-            buf[isamp] = max(0,min(maxDACvalue,int((2**DACbits)*eval(w,dup*(isamp+0.5)/nsamp))))
-            #print('1: ', isamp, ' ', value)
+        if playing is buf and key==playing_key: #same samples, only the frequency changes
+            w['F_out'] = fclock/setclkdiv(clkdiv)/nsamp*dup
+            w['AWG_status']='running'
+            if t:
+                t.phase('clkdiv')
+                t.end(nsamp,dup,clkdiv)
+            return
+
+        path=makewave(buf,w,nsamp,dup,clkdiv)
+        if t:
+            t.phase('fill')
+            t.note('path',path)
 
         w['nsamp'] = nsamp
      
         #set the clock divider
-        clkdiv_int=min(clkdiv,65535)
-        clkdiv_frac=0 #fractional clock division results in jitter
-        mem32[PIO0_SM0_CLKDIV]=(clkdiv_int<<16)|(clkdiv_frac<<8)
+        clkdiv_int=setclkdiv(clkdiv)
 
         F_actual = fclock/clkdiv_int/nsamp*dup
         w['F_out'] = F_actual
         #print('F_AWS= ', f, '  F_actual= ', F_actual, '  F-err= ', w['F_error'])
 
         gc.collect()
+        if t: t.phase('gc')
 
-        startDMA(buf,int(nsamp/4)) #we transfer 4 bytes at a time, so samples / 4
+        startplay(buf,int(nsamp/4)) #we transfer 4 bytes at a time, so samples / 4
+        playing_key=key
+        playing_dup=dup
+        if t:
+            t.phase('dma')
+            t.end(nsamp,dup,clkdiv)
 
         w['AWG_status']='running'
 
@@ -156,6 +786,60 @@ def setupwave(buf,w):
         print('setupwave crashed: ', e)
         raise
 
+#double buffered set up: while the DMA keeps playing one of the buffers in bufs,
+#the new wave is calculated into the other one and the DMA switches over at
+#the end of a period, so the output never stops.
+def setupwave_db(bufs,w):
+    global playing_key, playing_dup
+    if stream_noise and w['func'] in streamed: #noise streams through both buffers
+        setupstream((bufs[0],bufs[1]),w)
+        return
+    if playing is None: #generator not running or streaming, plain start with the first buffer
+        setupwave(bufs[0],w)
+        return
+
+    t=trace
+    if t: t.begin('setupwave_db',w)
+    w['AWG_status'] = 'calc wave'
+    nsamp,dup,clkdiv=planwave(w)
+    key=samplekey(w,nsamp,dup)
+    buf=bufs[1] if playing is bufs[0] else bufs[0]
+    if t: t.phase('plan')
+
+    try:
+        if key==playing_key: #same samples, only a new clock divider
+            w['F_out'] = fclock/setclkdiv(clkdiv)/nsamp*dup
+            w['AWG_status']='running'
+            if t:
+                t.phase('clkdiv')
+                t.end(nsamp,dup,clkdiv)
+            return
+
+        path=makewave(buf,w,nsamp,dup,clkdiv)
+        w['nsamp'] = nsamp
+        if t:
+            t.phase('fill')
+            t.note('path',path)
+
+        gc.collect()
+        if t: t.phase('gc')
+
+        switchplay(buf,int(nsamp/4),newclkdiv(clkdiv)) #same divider: no wait for the pass to end
+        playing_key=key
+        playing_dup=dup
+        if t: t.phase('switch')
+        clkdiv_int=setclkdiv(clkdiv)  #new buffer is playing, change its speed
+        if t:
+            t.phase('clkdiv')
+            t.end(nsamp,dup,clkdiv)
+
+        w['F_out'] = fclock/clkdiv_int/nsamp*dup
+        w['AWG_status']='running'
+
+    except Exception as e:
+        print('setupwave_db crashed: ', e)
+        raise
+
 #evaluate the content of a wave
 def eval(w,x):
     x=x*w['replicate']
@@ -188,4 +872,55 @@ def exponential(x,pars):
 def noise(x,pars): #pars[0]=quality: 1=uniform >10=gaussian
     return sum([random()-0.5 for _ in range(pars[0])])*sqrt(12/pars[0])
 
+def gnoise(x,pars): #gaussian noise, standard deviation 1
+    return wave_noise.next_gnoise()
+
+def pink(x,pars): #pink (1/f) noise, standard deviation 1
+    return wave_noise.next_pink()
+
+def arbitrary(x,pars): #uploaded samples, see set_upload
+    if upload_buf is None: return 0.0
+    return upload_buf[int(x*upload_nsamp)%upload_nsamp]/2**DACbits
+
+# whole-buffer kernels of the waveforms above, used by setupwave
+kernels = {sine : fill_sine,
+           pulse : fill_pulse,
+           gaussian : fill_gaussian,
+           sinc : fill_sinc,
+           exponential : fill_exponential,
+           noise : fill_noise,
+           gnoise : fill_gnoise,
+           pink : fill_pink,}
+
+# integer-only kernels, see wave_fixed
+fixed_kernels = {sine : wave_fixed.fill_sine,
+                 pulse : wave_fixed.fill_pulse,
+                 gaussian : wave_fixed.fill_gaussian,
+                 sinc : wave_fixed.fill_sinc,
+                 exponential : wave_fixed.fill_exponential,
+                 noise : wave_fixed.fill_noise,
+                 gnoise : wave_fixed.fill_gnoise,
+                 pink : wave_fixed.fill_pink,}
+
+# symmetry of the waveforms over one period, lets setupwave compute only half or a quarter
+symmetry = {sine : QUARTER,
+            gaussian : EVEN,
+            sinc : EVEN,}
+
+# kernels that must not be tiled as their output doesn't repeat within the buffer
+aperiodic = (fill_noise, fill_gnoise, fill_pink)
+
+# waveforms that never repeat, played by streaming when stream_noise is set
+streamed = (noise, gnoise, pink)
+
+# synthesis mode used by setupwave: 'float' or 'fixed' (integer only)
+synth_kernels = {'float' : kernels, 'fixed' : fixed_kernels}
+synthmode = 'float'
+
+def set_synth(mode):
+    global synthmode
+    if mode not in synth_kernels:
+        raise ValueError('unknown synthesis mode: ' + str(mode))
+    synthmode = mode
+
 # eof
\ No newline at end of file
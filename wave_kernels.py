@@ -0,0 +1,149 @@
+# Whole-buffer waveform kernels for the AWG
+#
+# Each kernel fills buf[start:stop] (bytearray or memoryview) in one call.
+# All kernels share the signature
+#   kernel(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits)
+# Sample isamp is taken at the same position as wave_gen.eval uses:
+#   x=dup*(isamp+0.5)/nsamp*replicate, reduced to 0.0-1.0
+# replicate, amplitude, offset and the DAC scaling are hoisted out of the
+# sample loop, the per-sample wave_gen.eval(w,x) path is kept for user functions.
+
+#symmetry of a waveform over one period, declared in wave_gen.symmetry
+EVEN=1      #f(1-x)=f(x)
+QUARTER=2   #f(0.5-x)=f(x) and f(x+0.5)=-f(x), like sine
+
+from math import exp
+from wave_lut import fill_sine, fill_sinc, fill_sine_quarter
+from wave_noise import fill_noise, fill_gnoise, fill_pink    #integer noise engine, see wave_noise
+
+
+def fill_pulse(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    a=(1<<dacbits)*amplitude
+    b=(1<<dacbits)*offset
+    c=dup*replicate/nsamp
+    rise=pars[0]
+    upend=pars[0]+pars[1]
+    fallend=pars[0]+pars[1]+pars[2]
+    irise=a/rise if rise else 0.0
+    ifall=a/pars[2] if pars[2] else 0.0
+    hi=max(0,min(top,int(a+b)))
+    lo=max(0,min(top,int(b)))
+    for isamp in range(start,stop):
+        x=((isamp+0.5)*c)%1.0
+        if x<rise:
+            v=int(x*irise+b)
+        elif x<upend:
+            buf[isamp]=hi
+            continue
+        elif x<fallend:
+            v=int(a+b-(x-upend)*ifall)
+        else:
+            buf[isamp]=lo
+            continue
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+
+def fill_gaussian(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    a=(1<<dacbits)*amplitude
+    b=(1<<dacbits)*offset
+    c=dup*replicate/nsamp
+    iw=1.0/pars[0]
+    for isamp in range(start,stop):
+        u=((((isamp+0.5)*c)%1.0)-0.5)*iw
+        v=int(exp(-u*u)*a+b)
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+
+def fill_exponential(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    a=(1<<dacbits)*amplitude
+    b=(1<<dacbits)*offset
+    c=dup*replicate/nsamp
+    iw=-1.0/pars[0]
+    for isamp in range(start,stop):
+        v=int(exp((((isamp+0.5)*c)%1.0)*iw)*a+b)
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+
+
+def gcd(a,b):
+    while b:
+        a,b=b,a%b
+    return a
+
+#copy buf[0:unit] over buf[unit:nsamp], doubling the copied block each pass
+def tile(buf,unit,nsamp):
+    mv=memoryview(buf)
+    n=unit
+    while n<nsamp:
+        k=min(n,nsamp-n)
+        mv[n:n+k]=mv[0:k]
+        n+=k
+
+#buf[last-i]=buf[first+i] for i in 0..n-1
+def mirror(buf,first,last,n):
+    for i in range(n):
+        buf[last-i]=buf[first+i]
+
+#fill buf[0:unit] holding exactly one period using the symmetry of the waveform.
+#EVEN computes the first half and mirrors it. QUARTER computes the first quarter,
+#mirrors it, computes the third quarter as the first one with negated amplitude and
+#mirrors that. Sample positions are those of kernel(buf,0,unit,nsamp,dup,...).
+def fill_symmetric(kernel,sym,buf,unit,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    if sym==QUARTER and unit&3==0:
+        if kernel==fill_sine:   #table sine writes all four quarters per lookup
+            fill_sine_quarter(buf,unit,replicate,amplitude,offset,dacbits)
+            return
+        q=unit>>2
+        kernel(buf,0,q,nsamp,dup,replicate,pars,amplitude,offset,dacbits)
+        mirror(buf,0,2*q-1,q)
+        kernel(memoryview(buf)[2*q:],0,q,nsamp,dup,replicate,pars,-amplitude,offset,dacbits)
+        mirror(buf,2*q,unit-1,q)
+    elif sym==EVEN:
+        h=unit>>1
+        kernel(buf,0,unit-h,nsamp,dup,replicate,pars,amplitude,offset,dacbits)
+        mirror(buf,0,unit-1,h)
+    else:
+        kernel(buf,0,unit,nsamp,dup,replicate,pars,amplitude,offset,dacbits)
+
+#length of the repeating unit of nsamp samples holding dup*replicate periods.
+#The pattern repeats every nsamp/gcd(nsamp,dup*replicate) samples, also when
+#nsamp/dup is not an integer.
+def unit_length(nsamp,dup,replicate):
+    cycles=dup*replicate
+    if cycles!=int(cycles):
+        return nsamp
+    return nsamp//gcd(nsamp,abs(int(cycles)))
+
+#calculate the minimal repeating unit of a periodic kernel into buf, returns its length.
+#When that unit is a single period, the symmetry sym of the waveform is used as well.
+def fill_unit(kernel,buf,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8,sym=0):
+    unit=unit_length(nsamp,dup,replicate)
+    if unit*abs(dup*replicate)==nsamp:
+        fill_symmetric(kernel,sym,buf,unit,nsamp,dup,replicate,pars,amplitude,offset,dacbits)
+    else:
+        kernel(buf,0,unit,nsamp,dup,replicate,pars,amplitude,offset,dacbits)
+    return unit
+
+#fill buf[0:nsamp] with a periodic kernel by calculating only the repeating unit and tiling it
+def fill_periodic(kernel,buf,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8,sym=0):
+    unit=fill_unit(kernel,buf,nsamp,dup,replicate,pars,amplitude,offset,dacbits,sym)
+    tile(buf,unit,nsamp)
+    return unit
+
+
+#normalised shape of a wave: kernel output at SHAPE_BITS with SHAPE_AMPLITUDE and
+#SHAPE_OFFSET, that is 32768+4096*f(x) with room for noise up to +-8
+SHAPE_BITS=16
+SHAPE_AMPLITUDE=1/16
+SHAPE_OFFSET=0.5
+
+#buf[0:n] from a normalised shape with new amplitude and offset, one integer pass
+def rescale(buf,shape,n,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    g=int(amplitude*(1<<(dacbits+4))+0.5)    #f=(s-32768)/4096, out=(s*g+b)>>16
+    b=int(offset*(1<<(dacbits+16)))-(g<<15)+(g>>1)
+    for i in range(n):
+        v=(shape[i]*g+b)>>16
+        buf[i]=0 if v<0 else (top if v>top else v)
+
+# eof
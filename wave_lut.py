@@ -0,0 +1,152 @@
+# Table driven sine synthesis for the AWG
+#
+# The RP2040 has no FPU, so every math.sin() call in wave_gen runs as soft-float.
+# Here a quarter wave of sine is computed once at import time (integer Q15 values)
+# and the buffer is filled by a phase accumulator that only uses integer
+# arithmetic in the sample loop.
+#
+# phase:  30 bit accumulator, one full sine period = 2**30
+#         (30 bits keep all values inside MicroPython small ints)
+#         bits 29..28  quadrant
+#         bits 27..20  index into the quarter wave table
+#         bits 19..0   fraction used for linear interpolation
+
+from array import array
+from math import pi, sin
+
+QBITS=8                       #256 table entries per quarter wave
+QSIZE=1<<QBITS
+PHASE_BITS=30
+PHASE_MASK=(1<<PHASE_BITS)-1
+QUARTER=1<<(PHASE_BITS-2)     #phase of a quarter period
+QUARTER_MASK=QUARTER-1
+FRAC_BITS=PHASE_BITS-2-QBITS
+FRAC_MASK=(1<<FRAC_BITS)-1
+AMP=32767                     #table amplitude (Q15)
+SCALE_BITS=28                 #fixed point scaling of amplitude/offset in the fill loop, DAC bits included
+RAD2PHASE=(1<<PHASE_BITS)/(2*pi)
+
+#quarter wave table, one extra entry so the interpolation never runs off the end
+qsin=array('h',[int(AMP*sin(0.5*pi*i/QSIZE)+0.5) for i in range(QSIZE+1)])
+
+
+#sine of a phase, returns -AMP..AMP
+def qlookup(ph):
+    t=qsin
+    q=ph>>(PHASE_BITS-2)
+    pq=ph&QUARTER_MASK
+    if q&1: pq=QUARTER-pq   #2nd and 4th quadrant run backwards through the table
+    i=pq>>FRAC_BITS
+    f=pq&FRAC_MASK
+    v=t[i]
+    if f: v+=((t[i+1]-v)*f)>>FRAC_BITS
+    if q&2: return -v       #3rd and 4th quadrant are negative
+    return v
+
+#float sine of an angle in radians using the table
+def lsin(t):
+    return qlookup(int(t*RAD2PHASE)&PHASE_MASK)/AMP
+
+
+#fill buf[start:stop] with sin(2*pi*dup*replicate*(isamp+0.5)/nsamp)*amplitude+offset
+#scaled to the DAC range, dup*replicate must be an integer
+def fill_sine(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    t=qsin
+    cycles=dup*replicate
+    top=(1<<dacbits)-1
+    gb=SCALE_BITS-dacbits
+    g=int(amplitude*(1<<SCALE_BITS)/AMP+0.5)
+    b=int(offset*(1<<SCALE_BITS))
+    #exact phase of the first sample (rounded to nearest, so the phases of mirrored
+    #samples mirror exactly) and its step as quotient/remainder pairs,
+    #so the accumulator never drifts over the buffer
+    num=((cycles*(2*start+1))<<(PHASE_BITS-1))+(nsamp>>1)
+    ph=(num//nsamp)&PHASE_MASK
+    r=num%nsamp
+    step=cycles<<PHASE_BITS
+    qs=(step//nsamp)&PHASE_MASK
+    rs=step%nsamp
+    for isamp in range(start,stop):
+        q=ph>>(PHASE_BITS-2)
+        pq=ph&QUARTER_MASK
+        if q&1: pq=QUARTER-pq
+        i=pq>>FRAC_BITS
+        f=pq&FRAC_MASK
+        v=t[i]
+        if f: v+=((t[i+1]-v)*f)>>FRAC_BITS
+        if q&2: v=-v
+        v=(v*g+b)>>gb
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+        ph+=qs
+        r+=rs
+        if r>=nsamp:
+            r-=nsamp
+            ph+=1
+        ph&=PHASE_MASK
+
+#fill buf[0:unit] with exactly one period of sine, unit a multiple of 4.
+#only the first quarter is looked up, each value is written to all four quarters:
+#the 2nd quarter mirrors the 1st, the 2nd half is the 1st half negated.
+def fill_sine_quarter(buf,unit,replicate,amplitude,offset,dacbits=8):
+    t=qsin
+    top=(1<<dacbits)-1
+    gb=SCALE_BITS-dacbits
+    g=int(amplitude*(1<<SCALE_BITS)/AMP+0.5)
+    b=int(offset*(1<<SCALE_BITS))
+    if replicate<0: g=-g    #sin(2*pi*(1-x))=-sin(2*pi*x)
+    q=unit>>2
+    half=q<<1
+    num=(1<<(PHASE_BITS-1))+(unit>>1)
+    ph=num//unit
+    r=num%unit
+    step=1<<PHASE_BITS
+    qs=step//unit
+    rs=step%unit
+    for isamp in range(q):
+        i=ph>>FRAC_BITS
+        f=ph&FRAC_MASK
+        v=t[i]
+        if f: v+=((t[i+1]-v)*f)>>FRAC_BITS
+        v=v*g
+        p=(b+v)>>gb
+        p=0 if p<0 else (top if p>top else p)
+        buf[isamp]=p
+        buf[half-1-isamp]=p
+        p=(b-v)>>gb
+        p=0 if p<0 else (top if p>top else p)
+        buf[half+isamp]=p
+        buf[unit-1-isamp]=p
+        ph+=qs
+        r+=rs
+        if r>=unit:
+            r-=unit
+            ph+=1
+
+#fill buf[start:stop] with sinc, same sample positions as wave_gen.eval
+def fill_sinc(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    width=pars[0]
+    top=(1<<dacbits)-1
+    a=(1<<dacbits)*amplitude
+    b=(1<<dacbits)*offset
+    c=dup*replicate/nsamp
+    k=RAD2PHASE/width
+    wa=width*a/AMP
+    t=qsin
+    for isamp in range(start,stop):
+        u=(((isamp+0.5)*c)%1.0)-0.5
+        if u==0.0:
+            v=int(a+b)
+        else:
+            ph=int(u*k)&PHASE_MASK
+            q=ph>>(PHASE_BITS-2)
+            pq=ph&QUARTER_MASK
+            if q&1: pq=QUARTER-pq
+            i=pq>>FRAC_BITS
+            f=pq&FRAC_MASK
+            s=t[i]
+            if f: s+=((t[i+1]-s)*f)>>FRAC_BITS
+            if q&2: s=-s
+            v=int(s*wa/u+b)
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+
+# eof
@@ -0,0 +1,173 @@
+# Noise engine for the AWG
+#
+# Integer noise generators that write straight into the sample buffer,
+# without random() calls or a temporary list per sample.
+# Kernels have the wave_kernels signature
+#   kernel(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits)
+#   fill_noise    sum of pars[0] uniform values (1=uniform, more is closer to gaussian)
+#   fill_gnoise   gaussian, inverse normal distribution table
+#   fill_pink     pink (1/f), Voss-McCartney with 8 octave rows plus white
+#
+# The generator combines two multiply-with-carry generators on 15 bit digits
+# (Marsaglia), z=a*(z&32767)+(z>>15). With a*2**15-1 a safe prime each has a
+# period of about 2**29, and all values stay below 2**30, inside MicroPython
+# small ints, so the loops run in @micropython.native without long ints.
+# Every draw gives 15 bits: (z1^z2)&32767.
+# seed(s) restarts all generators, so noise buffers are reproducible.
+
+from array import array
+from math import log, sqrt
+
+try:
+    import micropython
+except ImportError:     # CPython host, emitter decorators do nothing
+    class micropython:
+        native=viper=staticmethod(lambda f: f)
+
+A1=32760
+A2=32730
+NSCALE=27               #out=(f*g+b)>>(NSCALE-dacbits), f in Q12, 4096 = one standard deviation
+FBITS=12
+FMAX=(4<<FBITS)-1       #clip at 4 standard deviations, keeps f*g below 2**30
+PINK_ROWS=8
+
+#generator state: z1, z2, pink counter, pink sum, pink rows
+state=array('i',[0]*(4+PINK_ROWS))
+
+def seed(s=1):
+    st=state
+    st[0]=1+(s*7919)%(A1*32768-2)
+    st[1]=1+(s*104729+12345)%(A2*32768-2)
+    st[2]=0
+    st[3]=0
+    for i in range(PINK_ROWS):
+        st[4+i]=0
+
+seed()
+
+
+#inverse normal distribution at (i+0.5)/1024 in Q12, built on first use
+GBITS=10
+gtab=None
+
+#Acklam's rational approximation of the inverse normal distribution
+def _invnorm(p):
+    a=(-3.969683028665376e+01,2.209460984245205e+02,-2.759285104469687e+02,
+       1.383577518672690e+02,-3.066479806614716e+01,2.506628277459239e+00)
+    b=(-5.447609879822406e+01,1.615858368580409e+02,-1.556989798598866e+02,
+       6.680131188771972e+01,-1.328068155288572e+01)
+    c=(-7.784894002430293e-03,-3.223964580411365e-01,-2.400758277161838e+00,
+       -2.549732539343734e+00,4.374664141464968e+00,2.938163982698783e+00)
+    d=(7.784695709041462e-03,3.224671290700398e-01,2.445134137142996e+00,3.754408661907416e+00)
+    if p<0.02425:
+        q=sqrt(-2*log(p))
+        return (((((c[0]*q+c[1])*q+c[2])*q+c[3])*q+c[4])*q+c[5])/((((d[0]*q+d[1])*q+d[2])*q+d[3])*q+1)
+    if p>1-0.02425:
+        return -_invnorm(1-p)
+    q=p-0.5
+    r=q*q
+    return (((((a[0]*r+a[1])*r+a[2])*r+a[3])*r+a[4])*r+a[5])*q/(((((b[0]*r+b[1])*r+b[2])*r+b[3])*r+b[4])*r+1)
+
+def _gtab():
+    global gtab
+    if gtab is None:
+        n=1<<GBITS
+        gtab=array('h',[int(_invnorm((i+0.5)/n)*(1<<FBITS)) for i in range(n)])
+    return gtab
+
+
+def _gain(amplitude,offset,dacbits):
+    return (int(amplitude*(1<<(NSCALE-FBITS))+0.5), int(offset*(1<<NSCALE)), NSCALE-dacbits)
+
+@micropython.native
+def fill_noise(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    g,b,gb=_gain(amplitude,offset,dacbits)
+    n=max(1,pars[0])    #quality 0 from the ui counts as uniform
+    kn=int(sqrt(12/n)*(1<<12)+0.5)     #sum of n 15 bit values to Q12: (s*kn)>>15
+    mean=n<<14
+    st=state
+    z1=st[0]
+    z2=st[1]
+    pairs=n>>1
+    odd=n&1
+    for isamp in range(start,stop):
+        s=-mean
+        for _ in range(pairs):    #sums take the two generator digits as separate draws
+            z1=A1*(z1&32767)+(z1>>15)
+            z2=A2*(z2&32767)+(z2>>15)
+            s+=(z1&32767)+(z2&32767)
+        if odd:
+            z1=A1*(z1&32767)+(z1>>15)
+            z2=A2*(z2&32767)+(z2>>15)
+            s+=(z1^z2)&32767
+        f=(s*kn)>>15
+        if f>FMAX: f=FMAX
+        elif f<-FMAX: f=-FMAX
+        v=(f*g+b)>>gb
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+    st[0]=z1
+    st[1]=z2
+
+@micropython.native
+def fill_gnoise(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    g,b,gb=_gain(amplitude,offset,dacbits)
+    t=_gtab()
+    sh=15-GBITS
+    st=state
+    z1=st[0]
+    z2=st[1]
+    for isamp in range(start,stop):
+        z1=A1*(z1&32767)+(z1>>15)
+        z2=A2*(z2&32767)+(z2>>15)
+        v=(t[((z1^z2)&32767)>>sh]*g+b)>>gb
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+    st[0]=z1
+    st[1]=z2
+
+@micropython.native
+def fill_pink(buf,start,stop,nsamp,dup,replicate,pars,amplitude,offset,dacbits=8):
+    top=(1<<dacbits)-1
+    g,b,gb=_gain(amplitude,offset,dacbits)
+    kp=int((1<<(FBITS+14))*sqrt(12)/(3*32768)+0.5)   #sum of 9 rows to Q12: (s*kp)>>14
+    st=state
+    z1=st[0]
+    z2=st[1]
+    c=st[2]
+    s=st[3]
+    last=PINK_ROWS-1
+    for isamp in range(start,stop):
+        c=(c+1)&0xffff
+        k=0     #row k is renewed every 2**(k+1) samples
+        while k<last and not (c>>k)&1:
+            k+=1
+        z1=A1*(z1&32767)+(z1>>15)
+        z2=A2*(z2&32767)+(z2>>15)
+        r=((z1^z2)&32767)-16384
+        s+=r-st[4+k]
+        st[4+k]=r
+        z1=A1*(z1&32767)+(z1>>15)
+        z2=A2*(z2&32767)+(z2>>15)
+        f=((s+((z1^z2)&32767)-16384)*kp)>>14
+        if f>FMAX: f=FMAX
+        elif f<-FMAX: f=-FMAX
+        v=(f*g+b)>>gb
+        buf[isamp]=0 if v<0 else (top if v>top else v)
+    st[0]=z1
+    st[1]=z2
+    st[2]=c
+    st[3]=s
+
+
+#single samples with unit standard deviation for the per-sample wave_gen.eval path
+_one=array('H',[0])
+def next_gnoise():
+    fill_gnoise(_one,0,1,1,1,1,None,1/16,0.5,16)
+    return (_one[0]-32768)/4096
+
+def next_pink():
+    fill_pink(_one,0,1,1,1,1,None,1/16,0.5,16)
+    return (_one[0]-32768)/4096
+
+# eof
@@ -0,0 +1,88 @@
+# Sample rate planner for the AWG
+#
+# The output frequency is F=fclock*dup/(clkdiv*nsamp): nsamp samples (a multiple of 4,
+# at most the buffer size) hold dup periods and each sample lasts clkdiv clock cycles.
+# plan() searches nsamp, dup and the clock divider together. Among the plans whose
+# frequency error is within TOL it takes the one with the most samples per period
+# (nsamp/dup), when none gets there the one with the smallest error.
+# Plans keep at least (1-LOSS) of the samples per period the buffer and the smallest
+# possible divider allow, so accuracy never costs more than that in resolution.
+# With fractional=True the divider steps in 1/256 (PIO fractional divider), that nearly
+# removes the frequency error at the price of jitter of one clock cycle.
+# With ring=True plans of 2**k samples come first among the exact ones: wave_gen plays
+# those with the DMA read ring of one channel (startRing) instead of the chained pair.
+# Plans are memoised, repeated set ups of a frequency don't search again.
+# fixed() plans samples that are given as they are, e.g. an upload (wave_upload).
+
+TOL=1e-4          #frequency error that counts as exact, about the crystal tolerance
+LOSS=0.25         #samples per period that may be given up for accuracy
+CLKDIV_MAX=65535
+MEMO_SIZE=32
+
+memo={}
+
+#returns nsamp, dup and the clock divider (an int, or a float in steps of 1/256 when fractional)
+def plan(f,fclock,maxsamp,fractional=False,ring=False):
+    key=(f,fclock,maxsamp,fractional,ring)
+    p=memo.get(key)
+    if p is None:
+        p=search(f,fclock,maxsamp,fractional,ring)
+        if len(memo)>=MEMO_SIZE:
+            memo.clear()
+        memo[key]=p
+    return p
+
+#nsamp given samples of dup periods (uploaded waves), only the divider is chosen
+def fixed(f,fclock,nsamp,dup=1,fractional=False):
+    if dup<1:
+        raise ValueError('the samples must hold at least one period')
+    steps=256 if fractional else 1
+    d=int(fclock*dup*steps/(f*nsamp)+0.5)
+    d=min(CLKDIV_MAX*steps+steps-1,max(steps,d))
+    return nsamp,dup,d if steps==1 else d/steps
+
+#sample counts that fit the DMA read ring, 2**k from 4 to 32768 bytes
+def ringable(nsamp):
+    return 4<=nsamp<=32768 and not nsamp&(nsamp-1)
+
+def search(f,fclock,maxsamp,fractional=False,ring=False):
+    target=fclock/f          #clock cycles per period, clkdiv*nsamp/dup
+    steps=256 if fractional else 1
+    dmin=steps
+    dmax=CLKDIV_MAX*steps+steps-1
+    #most samples per period at a whole divider step, the resolution to keep
+    spp_max=target*steps/-(-target*steps//min(maxsamp,target))
+    floor=spp_max*(1-LOSS)
+    best=None
+    bestkey=None
+    dup=1
+    while dup==1 or maxsamp>=floor*dup:
+        cycles=target*dup*steps  #divider*nsamp for dup periods
+        low=max(4,(int(floor*dup)+3)&~3)
+        top=min(maxsamp,(int(target*dup)+2)&~3)
+        #step through the sample counts, or through the dividers when there are fewer of those
+        dlo=max(dmin,int(cycles/top)) if top else dmin
+        dhi=min(dmax,int(cycles/low)+1)
+        if dlo<=dhi and dhi-dlo<(top-low)>>2:
+            counts=[min(top,max(low,int(cycles/d/4+0.5)*4)) for d in range(dlo,dhi+1)]
+        else:
+            counts=range(top,low-1,-4)
+        if ring:  #the ring sizes the divider steps may have skipped
+            counts=list(counts)+[1<<k for k in range(2,16) if low<=1<<k<=top]
+        for nsamp in counts:
+            d=int(cycles/nsamp+0.5)
+            d=dmin if d<dmin else (dmax if d>dmax else d)
+            err=abs(d*nsamp/(dup*steps)-target)/target
+            spp=nsamp/dup
+            k=(0,1 if ring and not ringable(nsamp) else 0,-spp,err) if err<=TOL else (1,err,-spp)
+            if bestkey is None or k<bestkey:
+                bestkey=k
+                best=(nsamp,dup,d if steps==1 else d/steps)
+        if bestkey and bestkey[:2]==(0,0) and -bestkey[2]>=spp_max*0.99: #within 1% of the best resolution
+            break
+        dup+=1
+    if best is None:        #below 4 samples per period, the shortest wave the buffer holds
+        best=(4,max(1,int(4*f/fclock+0.5)),1)
+    return best
+
+# eof
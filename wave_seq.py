@@ -0,0 +1,116 @@
+# Sequences of waveform segments for the AWG
+#
+# A sequence plays segments one after the other at one sample rate, for bursts and
+# playlists, e.g. 5 cycles of sine, a gap, then a pulse train:
+#   seq = Sequence(1000000)                         # samples/s
+#   seq.wave(sine_wave, cycles=5)                   # a wave dict or Wave of wave_gen
+#   seq.gap(0.0005, level=0.5)                      # seconds at a constant level
+#   seq.wave(pulse_wave, cycles=10)
+#   seq.play(pool)                                  # loops, loop=False plays it once
+# One period of each wave is calculated into the pool (any buffer, ui uses the
+# arena) and repeated there up to BLOCK samples; a gap is a block of GAP constant
+# samples. The table of control blocks then plays these blocks as often as needed
+# (wave_gen.startSequence), so the CPU is not involved while a sequence plays.
+# Periods are a multiple of 4 samples: the frequency of a segment is the sample
+# rate over its period, see freqs(). After a burst the output holds its last sample.
+
+from array import array
+from uctypes import addressof
+import wave_gen as wg
+from wave_kernels import tile
+
+BLOCK=1024  #samples of a wave segment in the pool, whole periods repeated up to it
+GAP=256     #samples of the constant block of a gap
+
+
+class Sequence:
+
+    def __init__(self, rate):
+        self.rate = rate            # samples/s, rounded to a whole clock divider
+        self.segments = []          # ('wave', w, cycles) or ('gap', level, seconds)
+        self.table = None           # control blocks, 4 words each
+        self.start = None           # address of the table, read by the loop channel
+        self.periods = []           # samples per period of the wave segments
+        self.samples = 0            # samples of one pass
+
+    def wave(self, w, cycles=1):
+        self.segments.append(('wave', w, cycles))
+        return self
+
+    def gap(self, seconds, level=0.0):
+        self.segments.append(('gap', level, seconds))
+        return self
+
+    def clkdiv(self):
+        return max(1, int(wg.fclock/self.rate+0.5))
+
+    # frequencies of the wave segments as they play
+    def freqs(self):
+        rate = wg.fclock/self.clkdiv()
+        return [rate/n for n in self.periods]
+
+    # calculate the segments into pool and make the table of control blocks
+    def build(self, pool):
+        rate = wg.fclock/self.clkdiv()
+        mv = memoryview(pool)
+        base = addressof(pool)
+        used = 0
+        blocks = []     # (offset in pool, words)
+        self.periods = []
+        self.samples = 0
+        for kind, a, b in self.segments:
+            if kind == 'wave':
+                w, count = a, b
+                n = max(4, int(rate/w['frequency']/4+0.5)*4)
+                k = max(1, min(count, BLOCK//n))     # periods in the block
+                self.periods.append(n)
+            else:
+                v = max(0, min(wg.maxDACvalue, int((2**wg.DACbits)*a)))
+                n = 4
+                count = int(rate*b/n+0.5)           # words of the gap
+                k = min(GAP//n, count)
+                if k == 0:
+                    continue
+            size = k*n
+            if used+size > len(pool):
+                raise ValueError('sequence needs more than the {} bytes of the pool'.format(len(pool)))
+            if kind == 'wave':
+                wg.fillwave(mv[used:used+n], w, n, 1)
+            else:
+                mv[used:used+n] = bytes((v, v, v, v))
+            tile(mv[used:used+size], n, size)
+            full, rest = divmod(count, k)
+            blocks += [(used, size//4)]*full
+            if rest:
+                blocks.append((used, rest*n//4))
+            used += size
+            self.samples += count*n
+        if not blocks:
+            raise ValueError('empty sequence')
+        table = array('I', bytearray(16*len(blocks)))
+        for i, (off, words) in enumerate(blocks):
+            table[4*i] = wg.seqctrl(3)          # chain to the control channel
+            table[4*i+1] = base+off
+            table[4*i+2] = wg.PIO0_TXF0
+            table[4*i+3] = words
+        self.table = table
+        return used
+
+    def play(self, pool, loop=True):
+        # the pool may hold the sample buffers (ui plays from the arena): the wave playing
+        # from them and a job still calculating into them on the second core end first
+        wg.stopDMA()
+        wg.free_buffers()
+        self.build(pool)
+        last = len(self.table)-4
+        # a loop chains the last block to CH4, that starts the table again; a burst
+        # ends there and flags its end
+        self.table[last] = wg.seqctrl(4) if loop else wg.seqctrl(2, 0)
+        self.start = array('I', [addressof(self.table)])
+        wg.startSequence(self.table, self.start, self.clkdiv())
+
+    # seconds of one pass, once built
+    def duration(self):
+        return self.samples*self.clkdiv()/wg.fclock
+
+# eof
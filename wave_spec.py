@@ -0,0 +1,84 @@
+# Wave configuration and set up results of the AWG
+#
+# Wave keeps in slots what was a dict in ui: the parameters that define the samples
+# (func, pars, replicate, amplitude, offset), the frequency, what a set up found
+# (nsamp, F_out, AWG_status) and the ui state kept with it (frequency_value,
+# freq_range, phase). It is dict compatible, w['amplitude'] and w['pars'][0]=v
+# work as before, so wave_gen and the ui callbacks take a Wave or a plain dict.
+# snapshot(w) is a frozen, hashable copy of the parameters that define the samples;
+# wave_gen and WaveCache key on it and change detection is a comparison of two.
+# MicroPython accepts __slots__ but keeps an attribute dict per instance, so the
+# RAM saving shows on a PC (host/), on the Pico the attribute access is the gain.
+
+from collections import namedtuple
+
+WaveKey = namedtuple('WaveKey', ('func', 'pars', 'replicate', 'amplitude', 'offset'))
+
+
+class Wave:
+
+    __slots__ = ('func', 'pars', 'replicate', 'amplitude', 'offset', 'frequency',
+                 'nsamp', 'F_out', 'F_error', 'AWG_status',
+                 'frequency_value', 'freq_range', 'phase')
+
+    def __init__(self, func=None, pars=None, amplitude=0.5, offset=0.5, replicate=1,
+                 frequency=1000, **state):
+        self.func = func
+        self.pars = list(pars) if pars else [0.0, 0.0, 0.0]
+        self.replicate = replicate
+        self.amplitude = amplitude
+        self.offset = offset
+        self.frequency = frequency
+        self.nsamp = 0
+        self.F_out = 0
+        self.F_error = 0
+        self.AWG_status = 'stopped'
+        self.frequency_value = frequency
+        self.freq_range = 1
+        self.phase = 0
+        for k in state:
+            self[k] = state[k]
+
+    # frozen copy of what defines the samples, hashable
+    def snapshot(self):
+        return WaveKey(self.func, tuple(self.pars), self.replicate, self.amplitude, self.offset)
+
+    # dict compatibility
+    def __getitem__(self, k):
+        try:
+            return getattr(self, k)
+        except AttributeError:
+            raise KeyError(k)
+
+    def __setitem__(self, k, v):
+        if k not in self.__slots__:
+            raise KeyError(k)
+        setattr(self, k, v)
+
+    def __contains__(self, k):
+        return k in self.__slots__
+
+    def get(self, k, default=None):
+        return getattr(self, k, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in self.__slots__]
+
+    def copy(self):
+        w = Wave()
+        for k in self.__slots__:
+            setattr(w, k, getattr(self, k))
+        w.pars = list(self.pars)
+        return w
+
+
+# snapshot of a Wave or of a wave dict
+def snapshot(w):
+    if isinstance(w, Wave):
+        return w.snapshot()
+    return WaveKey(w['func'], tuple(w['pars']), w['replicate'], w['amplitude'], w['offset'])
+
+# eof
@@ -0,0 +1,119 @@
+# On-flash library of waves for the AWG
+#
+# A playing wave is saved as its raw samples, one blob file per entry, next to an
+# index that records how it plays: nsamp, dup, clkdiv, F_out and the CRC-32 of the
+# samples. Loading reads the blob with readinto straight into the sample buffer the
+# next set up plays, no function is evaluated:
+#   wave_store.save('sine 2kHz', wave)       # the wave playing now
+#   wave_store.load('sine 2kHz', wavbuf, wave)
+#   wave_store.delete('sine 2kHz')
+#   wave_store.entries()                     # names, sorted
+# A loaded wave plays as the function arbitrary of wave_gen, like an upload
+# (wave_upload): the divider is planned again for F_out, the same as stored unless
+# the system clock changed. ui picks entries on its library screen.
+#   <store_dir>/index.json  name -> {file, nsamp, dup, clkdiv, F_out, crc, func}
+#   <store_dir>/<n>.bin     the samples
+
+import os
+import json
+from binascii import crc32
+import wave_gen as wg
+from wave_config import store_dir
+
+index = None    # read on first use
+
+
+def path(name):
+    return store_dir+'/'+name
+
+
+def read_index():
+    global index
+    if index is None:
+        try:
+            with open(path('index.json')) as f:
+                index = json.load(f)
+        except OSError:     # no library yet
+            index = {}
+    return index
+
+
+def mkdir():
+    try:
+        os.mkdir(store_dir)
+    except OSError:     # exists
+        pass
+
+
+# written to a new file first, a power loss keeps the old index
+def write_index():
+    mkdir()
+    with open(path('index.tmp'), 'w') as f:
+        json.dump(index, f)
+    os.rename(path('index.tmp'), path('index.json'))
+
+
+# names of the entries, without the ones starting with '.' (wave_boot keeps the last wave)
+def entries():
+    return sorted([name for name in read_index() if name[:1] != '.'])
+
+
+def info(name):
+    return read_index()[name]
+
+
+# save the playing wave as name, func is shown with the entry (ui: the function menu)
+def save(name, w, func=''):
+    buf = wg.playing
+    if buf is None:
+        raise ValueError('no wave playing to save')
+    nsamp = 4*wg.playing_nword
+    mv = memoryview(buf)[0:nsamp]
+    read_index()
+    if name in index:
+        blob = index[name]['file']
+    else:
+        used = [int(e['file'].split('.')[0]) for e in index.values()]
+        blob = '{}.bin'.format(max(used)+1 if used else 0)
+    mkdir()
+    with open(path(blob), 'wb') as f:
+        f.write(mv)
+    index[name] = {'file': blob, 'nsamp': nsamp, 'dup': wg.playing_dup, 'clkdiv': wg.getclkdiv(),
+                   'F_out': w['F_out'], 'crc': crc32(mv), 'func': func}
+    write_index()
+
+
+# play entry name: its samples go into the buffer of bufs (one or two, see
+# wave_gen.setupwave_db) the next set up plays
+def load(name, bufs, w):
+    e = info(name)
+    nsamp = e['nsamp']
+    wg.free_buffers()
+    buf = wg.nextbuf(bufs)
+    if nsamp > len(buf):
+        raise ValueError('{} samples stored, the buffers hold {}'.format(nsamp, len(buf)))
+    wg.overwrite(buf)
+    mv = memoryview(buf)[0:nsamp]
+    with open(path(e['file']), 'rb') as f:
+        if f.readinto(mv) != nsamp:
+            raise ValueError('blob of {} is short'.format(name))
+    if crc32(mv) != e['crc']:
+        raise ValueError('blob of {} is corrupted'.format(name))
+    wg.set_upload(buf, nsamp, e['dup'], e['crc'])
+    w['func'] = wg.arbitrary
+    w['frequency'] = e['F_out']
+    if len(bufs) < 2:
+        wg.setupwave(buf, w)
+    else:
+        wg.setupwave_db(bufs, w)
+
+
+def delete(name):
+    e = read_index().pop(name)
+    try:
+        os.remove(path(e['file']))
+    except OSError:
+        pass
+    write_index()
+
+# eof
@@ -0,0 +1,79 @@
+# Timing and memory trace of the AWG set ups
+#
+# Records for each set up the duration of its phases (utime.ticks_us), the free
+# heap before and after (gc.mem_free()) and the nsamp/dup/clkdiv decisions, in a
+# ring of the most recent set ups. wave_gen only calls it while tracing is on:
+#   >>> wave_gen.set_trace(8)       # keep the last 8 set ups, 0 switches it off
+#   >>> wave_gen.trace.show()
+# phases of setupwave: plan, fill (calculate, cache or rescale), gc, dma
+# phases of setupwave_db: plan, fill, gc, switch, clkdiv
+
+import gc
+import utime
+
+
+def _mem_free():
+    try:
+        return gc.mem_free()
+    except AttributeError:  # CPython
+        return 0
+
+
+class SetupTrace:
+
+    def __init__(self, size=8):
+        self.size = size
+        self.ring = []          # records, oldest first
+        self.rec = None         # record of the set up in progress
+        self.t = 0
+
+    # start a record, kind is the set up function
+    def begin(self, kind, w):
+        self.t = utime.ticks_us()
+        self.rec = {'kind' : kind, 'func' : w['func'].__name__, 'frequency' : w['frequency'],
+                    'phases' : [], 'mem_before' : _mem_free()}
+
+    # end of a phase, its duration counts from the end of the previous one
+    def phase(self, name):
+        t = utime.ticks_us()
+        self.rec['phases'].append((name, utime.ticks_diff(t, self.t)))
+        self.t = t
+
+    # extra information about the set up, like the fill path
+    def note(self, key, value):
+        self.rec[key] = value
+
+    def end(self, nsamp, dup, clkdiv):
+        r = self.rec
+        r['mem_after'] = _mem_free()
+        r['nsamp'] = nsamp
+        r['dup'] = dup
+        r['clkdiv'] = clkdiv
+        r['total_us'] = sum(d for _, d in r['phases'])
+        self.ring.append(r)
+        if len(self.ring) > self.size:
+            self.ring.pop(0)
+        self.rec = None
+
+    def recent(self):
+        return self.ring
+
+    def last(self):
+        return self.ring[-1] if self.ring else None
+
+    # one line for the debug line of the screen
+    def summary(self, r=None):
+        r = r or self.last()
+        if r is None:
+            return 'no set up traced'
+        s = ' '.join('{} {:.1f}'.format(n, d/1000) for n, d in r['phases'])
+        return '{}ms {} mem {:+d}'.format(s, r.get('path', ''), r['mem_after']-r['mem_before'])
+
+    def show(self):
+        for r in self.ring:
+            print('{:12s} {:10s} {:>9} Hz  nsamp {:4d} dup {:4d} clkdiv {:>5}  {:7.1f} ms  free {} -> {}'.format(
+                r['kind'], r['func'], r['frequency'], r['nsamp'], r['dup'], r['clkdiv'],
+                r['total_us']/1000, r['mem_before'], r['mem_after']))
+            print('    ' + self.summary(r))
+
+# eof
@@ -0,0 +1,141 @@
+# Upload of arbitrary waveforms over the USB serial port (USB-CDC) of the Pico
+#
+# A host (host/upload_wave.py) sends raw 8-bit DAC samples, they are read with readinto
+# straight into the sample buffer the next set up plays and set up there as the wave
+# function arbitrary (wave_gen), so the divider is planned as for any other wave:
+#   uploader = Uploader()               # stdin/stdout of the USB port
+#   if uploader.poll(wavbuf, wave):     # from a task of the event loop
+#       ...                             # wave plays the uploaded samples
+# Protocol, integers little-endian, replies are single control bytes so that text the
+# Pico prints in between is skipped by the host:
+#   host:   MAGIC                                       device: ACK, ready
+#   host:   header nsamp, frequency, periods, chunk,    device: ACK, or CAN if refused
+#           CRC-32 of the samples, CRC-32 of the header
+#   host:   chunk samples, CRC-32 of the chunk          device: ACK, or NAK to resend it
+#   ...     until nsamp samples are received            device: ACK when playing, or CAN
+# nsamp is a multiple of 4 and at most the buffer size, the samples hold periods periods.
+# Ctrl-C is off from MAGIC to the end of the upload, the samples may contain 0x03.
+# With two buffers the old wave keeps playing until the upload is complete.
+
+import sys
+import select
+import struct
+from binascii import crc32
+import wave_gen as wg
+try:
+    from micropython import kbd_intr
+except ImportError:  # CPython
+    kbd_intr = None
+
+MAGIC = b'AWGU'
+HEADER = '<IfHHII'      # nsamp, frequency, periods, chunk, CRC of the samples, CRC of the header
+HEADER_SIZE = struct.calcsize(HEADER)
+ACK = b'\x06'
+NAK = b'\x15'
+CAN = b'\x18'
+TIMEOUT_MS = 1000       # without data the upload is given up
+
+
+class Uploader:
+
+    def __init__(self, rx=None, tx=None):
+        self.rx = rx or sys.stdin.buffer
+        self.tx = tx or sys.stdout.buffer
+        self.poller = select.poll()
+        self.poller.register(self.rx, select.POLLIN)
+        self.head = bytearray(HEADER_SIZE)
+        self.crc = bytearray(4)
+        self.byte = bytearray(1)
+        self.matched = 0        # bytes of MAGIC received
+        self.uploads = 0
+        self.resends = 0        # chunks received with a wrong CRC
+        self.error = None       # why the last upload failed
+
+    def ready(self, ms=0):
+        return bool(self.poller.poll(ms))
+
+    def reply(self, b):
+        self.tx.write(b)
+        if hasattr(self.tx, 'flush'):
+            self.tx.flush()
+
+    # fill mv from rx, False when no data comes for TIMEOUT_MS
+    def readinto(self, mv):
+        got = 0
+        n = len(mv)
+        while got < n:
+            if not self.ready(TIMEOUT_MS):
+                return False
+            got += self.rx.readinto(mv[got:] if got else mv) or 0
+        return True
+
+    # receive an upload that has started on rx and set it up as w in bufs (one or two
+    # buffers, see wave_gen.setupwave_db). True when the uploaded wave plays
+    def poll(self, bufs, w):
+        while self.matched < len(MAGIC) and self.ready():
+            self.rx.readinto(self.byte)
+            b = self.byte[0]
+            if b == MAGIC[self.matched]:
+                self.matched += 1
+            else:
+                self.matched = 1 if b == MAGIC[0] else 0
+        if self.matched < len(MAGIC):
+            return False
+        self.matched = 0
+        if kbd_intr:
+            kbd_intr(-1)
+        try:
+            ok = self.receive(bufs, w)
+        except Exception as e:  # a set up that fails must not end the task polling
+            ok = self.fail(str(e))
+        finally:
+            if kbd_intr:
+                kbd_intr(3)
+        if not ok:
+            self.reply(CAN)
+        return ok
+
+    def fail(self, error):
+        self.error = error
+        return False
+
+    def receive(self, bufs, w):
+        self.reply(ACK)
+        if not self.readinto(memoryview(self.head)):
+            return self.fail('no header')
+        nsamp, f, periods, chunk, crc, hcrc = struct.unpack(HEADER, self.head)
+        if crc32(memoryview(self.head)[0:HEADER_SIZE-4]) != hcrc:
+            return self.fail('header CRC')
+        wg.free_buffers()
+        buf = wg.nextbuf(bufs)
+        if nsamp & 3 or not 4 <= nsamp <= len(buf) or not f > 0 or not periods or not chunk:
+            return self.fail('refused {} samples'.format(nsamp))
+        wg.overwrite(buf)
+        self.reply(ACK)
+        mv = memoryview(buf)
+        pos = 0
+        while pos < nsamp:
+            part = mv[pos:min(nsamp, pos+chunk)]
+            if not (self.readinto(part) and self.readinto(memoryview(self.crc))):
+                return self.fail('timeout at sample {}'.format(pos))
+            if crc32(part) == struct.unpack('<I', self.crc)[0]:
+                pos += len(part)
+                self.reply(ACK)
+            else:
+                self.resends += 1
+                self.reply(NAK)
+        if crc32(mv[0:nsamp]) != crc:
+            return self.fail('CRC of the samples')
+        wg.set_upload(buf, nsamp, periods, crc)
+        w['func'] = wg.arbitrary
+        w['frequency'] = f
+        if len(bufs) < 2:
+            wg.setupwave(buf, w)
+        else:
+            wg.setupwave_db(bufs, w)
+        self.uploads += 1
+        self.error = None
+        self.reply(ACK)
+        return True
+
+# eof
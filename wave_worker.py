@@ -0,0 +1,111 @@
+# Wave calculation on the second core of the RP2040
+#
+# Core 0 runs the micro-gui and the set ups, core 1 waits for jobs of a Worker:
+#   worker = Worker()               # starts the thread on core 1 (_thread)
+#   wave_gen.set_worker(worker)
+# A job is a function with its arguments, handed over in a mailbox guarded by a
+# lock. wave_gen splits the kernel calls of a fill (wave_kernels signature) in two
+# halves, core 1 calculates one while core 0 calculates the other (split). wave_async
+# hands a whole fill to core 1 and waits for it in the event loop (wait), so the gui
+# runs on core 0 while the wave is calculated.
+# Kernels calculate every sample from its position, so a split fill is the same as
+# one by a single core. The noise kernels keep a generator state and are never split.
+# The same code runs with ordinary threads on a PC, see host/check_worker.py.
+
+import _thread
+import utime
+try:
+    from uasyncio import ThreadSafeFlag
+except ImportError:  # CPython, or a MicroPython without it: wait() polls
+    ThreadSafeFlag = None
+try:
+    import uasyncio as asyncio
+except ImportError:  # CPython
+    import asyncio
+
+SPLIT_MIN = 64      # fewer samples are calculated by the calling core alone
+
+
+class Worker:
+
+    def __init__(self):
+        self.lock = _thread.allocate_lock()     # guards the mailbox
+        self.go = _thread.allocate_lock()       # released to wake core 1
+        self.go.acquire()
+        self.job = None         # (func, args) waiting or being calculated
+        self.result = None
+        self.error = None
+        self.jobs = 0
+        self.flag = ThreadSafeFlag() if ThreadSafeFlag else None
+        _thread.start_new_thread(self._loop, ())
+
+    def _loop(self):
+        while True:
+            self.go.acquire()
+            with self.lock:
+                func, args = self.job
+            try:
+                result, error = func(*args), None
+            except Exception as e:
+                result, error = None, e
+            with self.lock:
+                self.result = result
+                self.error = error
+                self.job = None
+                self.jobs += 1
+            if self.flag:
+                self.flag.set()
+
+    def idle(self):
+        with self.lock:
+            return self.job is None
+
+    # wait for the job in progress, on the calling core
+    def join(self):
+        while not self.idle():
+            utime.sleep_us(20)
+
+    # hand func(*args) to core 1, after the job in progress
+    def submit(self, func, args):
+        self.join()
+        with self.lock:
+            self.job = (func, args)
+            self.result = None
+            self.error = None
+        self.go.release()
+
+    def collect(self):
+        if self.error:
+            raise self.error
+        return self.result
+
+    # result of the job, blocking
+    def run(self, func, args):
+        self.submit(func, args)
+        self.join()
+        return self.collect()
+
+    # result of the job, the event loop keeps running meanwhile
+    async def wait(self):
+        while not self.idle():
+            if self.flag:
+                await self.flag.wait()
+            else:
+                await asyncio.sleep(0)
+        return self.collect()
+
+    # a kernel with the same arguments that calculates start..stop on both cores
+    def split(self, kernel):
+        def both(buf, start, stop, *args):
+            n = stop-start
+            if n < SPLIT_MIN:
+                kernel(buf, start, stop, *args)
+                return
+            h = start+(n >> 1)
+            self.submit(kernel, (buf, h, stop)+args)
+            kernel(buf, start, h, *args)
+            self.join()
+            self.collect()
+        return both
+
+# eof